@@ -0,0 +1,145 @@
+#!/usr/local/bin/python3
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import time
+
+from precheck import infeasibility_reasons
+from solver import extract_layout, model, Component, FixedArena, HardwareConfig, Partition, \
+    PartitionArena
+
+import z3
+
+
+def parse_address(value):
+    if isinstance(value, str):
+        return int(value, 0)
+    return value
+
+
+def arena_access(spec, components):
+    # Without explicit readers and writers the owners are taken from the arena name, as in
+    # "server+client/shared", and code arenas are only readable
+    if "readers" in spec or "writers" in spec:
+        return ([components[name] for name in spec.get("readers", [])],
+                [components[name] for name in spec.get("writers", [])])
+    (owners, _, kind) = spec["name"].partition("/")
+    owners = [components[name] for name in owners.split("+") if name in components]
+    return (owners, [] if kind == "code" else owners)
+
+
+def build_config(spec):
+    hw_spec = spec.get("hardware_configuration", {})
+    hw_config = HardwareConfig(region_min_size=hw_spec.get("min_region_size", 256),
+                               region_count=hw_spec.get("region_count", 8),
+                               subregion_count=hw_spec.get("subregion_count", 8),
+                               complex_overlap_constraint=hw_spec.get(
+                                   "complex_overlap_constraint", False),
+                               size_encoding=hw_spec.get("size_encoding", "bitvector"))
+
+    partitions = {}
+    for p in spec["partitions"]:
+        partitions[p["name"]] = Partition(p["name"], parse_address(p["start"]),
+                                          parse_address(p["end"]))
+
+    components = {}
+    for c in spec["components"]:
+        name = c if isinstance(c, str) else c["name"]
+        components[name] = Component(name, hw_config)
+
+    arenas = []
+    for a in spec["arenas"]:
+        (readers, writers) = arena_access(a, components)
+        size = parse_address(a["size"])
+        kind = a.get("type", "partition_arena")
+        if kind == "fixed_arena":
+            start = parse_address(a["position"])
+            arenas.append(FixedArena(a["name"], start, start + size, readers, writers))
+        elif kind == "partition_arena":
+            arenas.append(PartitionArena(a["name"], partitions[a["partition"]], size, readers,
+                                         writers))
+        else:
+            raise ValueError("Unknown arena type {}".format(kind))
+    return (list(components.values()), arenas)
+
+
+def load_specs(source):
+    # A directory of JSON files, a JSON lines file or a single JSON file
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if filename.endswith(".json"):
+                with open(os.path.join(source, filename)) as f:
+                    yield (os.path.splitext(filename)[0], json.load(f))
+    elif source.endswith(".jsonl"):
+        with open(source) as f:
+            for (i, line) in enumerate(f):
+                if line.strip():
+                    spec = json.loads(line)
+                    yield (spec.get("name", "line_{}".format(i + 1)), spec)
+    else:
+        with open(source) as f:
+            yield (os.path.splitext(os.path.basename(source))[0], json.load(f))
+
+
+def solve_spec(job):
+    (name, spec, timeout, model_options) = job
+    started = time.time()
+    try:
+        (components, arenas) = build_config(spec)
+        reasons = infeasibility_reasons(components, arenas)
+        if reasons:
+            return {"name": name, "result": "unsat", "reasons": reasons,
+                    "time": time.time() - started}
+        s = model(components, arenas, **model_options)
+        if timeout is not None:
+            s.set(timeout=int(timeout * 1000))
+        result = s.check()
+    except (KeyError, ValueError, z3.Z3Exception) as e:
+        return {"name": name, "result": "error", "error": str(e),
+                "time": time.time() - started}
+
+    record = {"name": name, "result": str(result), "time": time.time() - started}
+    if result == z3.sat:
+        record.update(extract_layout(s.model(), components, arenas))
+    return record
+
+
+def write_record(destination, record):
+    if destination.endswith(".jsonl"):
+        with open(destination, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    else:
+        os.makedirs(destination, exist_ok=True)
+        with open(os.path.join(destination, record["name"] + ".json"), "w") as f:
+            json.dump(record, f, indent=4)
+
+
+def run_batch(source, destination, workers=None, timeout=None, **model_options):
+    # Records are written in the order configurations finish, not the order they came in
+    context = multiprocessing.get_context("spawn")
+    jobs = ((name, spec, timeout, model_options) for (name, spec) in load_specs(source))
+    results = {}
+    with context.Pool(workers) as pool:
+        for record in pool.imap_unordered(solve_spec, jobs):
+            print('({:%Y-%m-%d %H:%M:%S}) {}: {} ({:.1f}s)'.format(
+                datetime.datetime.now(), record["name"], record["result"], record["time"]))
+            write_record(destination, record)
+            results[record["result"]] = results.get(record["result"], 0) + 1
+    return results
+
+
+if __name__ == '__main__':
+    z3.set_option(max_args=10000000, max_lines=1000000, max_depth=10000000, max_visited=1000000)
+
+    parser = argparse.ArgumentParser(description="Solve MPU layouts for a batch of input specs")
+    parser.add_argument("source", help="directory of JSON files, JSON lines file or JSON file")
+    parser.add_argument("destination", help="JSON lines file or directory for the layouts")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per configuration")
+    parser.add_argument("--quantifier-free", action="store_true")
+    args = parser.parse_args()
+
+    model_options = {"quantifier_free": True} if args.quantifier_free else {}
+    print(run_batch(args.source, args.destination, args.workers, args.timeout, **model_options))
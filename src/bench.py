@@ -0,0 +1,162 @@
+#!/usr/local/bin/python3
+import argparse
+import datetime
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+import z3
+
+from cache import solver_statistics
+from instrument import Instrumentation, JsonLinesSink
+from main import get_setup, get_finalizer
+from shrinker import min_ram_size
+from solver import model, SIZE_ENCODINGS
+from vms import ConfigGenerator
+
+RAM_FACTORS = [1.05, 1.15, 1.3]
+
+
+def cell_name(cell):
+    return "setup_{}/finalizer_{}/complex_{}/ram_{}".format(
+        cell["setup"], cell["finalizer"], cell["complex"], cell["ram_factor"])
+
+
+def bench_cell(cell, config_generator=None, name=cell_name):
+    # Every cell runs in a fresh process, so the peak RSS is that of this cell alone. Cells
+    # of other configurations than the shipped setups come with their own generator and name
+    if config_generator is None:
+        config_generator = ConfigGenerator(get_setup(cell["setup"]),
+                                           get_finalizer(cell["finalizer"]),
+                                           size_encoding=cell["size_encoding"])
+    (components, arenas) = config_generator(cell["ram_size"], cell["complex"])
+
+    instrumentation = None
+    if cell.get("events") is not None:
+        instrumentation = Instrumentation(JsonLinesSink(cell["events"]))
+
+    started = time.time()
+    if instrumentation is None:
+        s = model(components, arenas, **cell["model_options"])
+    else:
+        s = instrumentation.model(components, arenas, {"cell": name(cell)},
+                                  **cell["model_options"])
+    build_time = time.time() - started
+    if cell["timeout"] is not None:
+        s.set(timeout=int(cell["timeout"] * 1000))
+
+    started = time.time()
+    if instrumentation is None:
+        result = s.check()
+    else:
+        result = instrumentation.check(s, cell=name(cell))
+    solve_time = time.time() - started
+
+    record = dict(cell)
+    record.update({
+        "name": name(cell),
+        "components": len(components),
+        "arenas": len(arenas),
+        "result": str(result),
+        "build_time": build_time,
+        "solve_time": solve_time,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "statistics": solver_statistics(s),
+    })
+    return record
+
+
+def bench_cells(setups, finalizers, ram_factors, timeout, model_options, events=None,
+                size_encoding=None):
+    for setup in setups:
+        for finalizer in finalizers:
+            config_generator = ConfigGenerator(get_setup(setup), get_finalizer(finalizer))
+            min_size = min_ram_size(config_generator)
+            for complex_overlap_constraint in [False, True]:
+                for ram_factor in ram_factors:
+                    yield {"setup": setup, "finalizer": finalizer,
+                           "complex": complex_overlap_constraint, "ram_factor": ram_factor,
+                           "ram_size": int(min_size * ram_factor), "timeout": timeout,
+                           "model_options": model_options, "events": events,
+                           "size_encoding": size_encoding}
+
+
+def run_benchmarks(cells, workers=1, run=bench_cell):
+    # One worker by default, cells running side by side would skew each other's timings
+    context = multiprocessing.get_context("spawn")
+    records = []
+    with context.Pool(workers, maxtasksperchild=1) as pool:
+        for record in pool.imap(run, cells):
+            print('({:%Y-%m-%d %H:%M:%S}) {}: {} (build {:.1f}s, solve {:.1f}s, {} KB)'.format(
+                datetime.datetime.now(), record["name"], record["result"],
+                record["build_time"], record["solve_time"], record["peak_rss_kb"]))
+            records.append(record)
+    return records
+
+
+def compare(records, baseline, threshold=0.25, min_delta=1.0):
+    # A cell regresses if it changes its answer, or if it got slower or bigger by more than
+    # the threshold. Differences below min_delta seconds are timing noise
+    baseline = dict((record["name"], record) for record in baseline)
+    regressions = []
+    for record in records:
+        old = baseline.get(record["name"])
+        if old is None:
+            continue
+        if old["result"] in ["sat", "unsat"] and record["result"] != old["result"]:
+            regressions.append((record["name"], "result", old["result"], record["result"]))
+        for metric in ["build_time", "solve_time"]:
+            if record[metric] > old[metric] * (1 + threshold) and \
+                    record[metric] - old[metric] > min_delta:
+                regressions.append((record["name"], metric, old[metric], record[metric]))
+        if record["peak_rss_kb"] > old["peak_rss_kb"] * (1 + threshold):
+            regressions.append((record["name"], "peak_rss_kb", old["peak_rss_kb"],
+                                record["peak_rss_kb"]))
+    return regressions
+
+
+def parse_list(value, kind=int):
+    return [kind(x) for x in value.split(",")]
+
+
+if __name__ == '__main__':
+    z3.set_option(max_args=10000000, max_lines=1000000, max_depth=10000000, max_visited=1000000)
+
+    parser = argparse.ArgumentParser(description="Benchmark the solver over the shipped setups")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--setups", type=parse_list, default=[1, 2, 3, 4, 5])
+    parser.add_argument("--finalizers", type=parse_list, default=[1, 2, 3])
+    parser.add_argument("--ram-factors", type=lambda v: parse_list(v, float), default=RAM_FACTORS)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds per cell")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--quantifier-free", action="store_true")
+    parser.add_argument("--overlap-encoding", default="pairwise",
+                        choices=["pairwise", "partition", "sorted"])
+    parser.add_argument("--symmetry-breaking", action="store_true")
+    parser.add_argument("--size-encoding", default=None, choices=SIZE_ENCODINGS,
+                        help="region size encoding, the one of the setups by default")
+    parser.add_argument("--events", default=None, help="JSON lines file for solver events")
+    args = parser.parse_args()
+
+    model_options = {"quantifier_free": True} if args.quantifier_free else {}
+    if args.overlap_encoding != "pairwise":
+        model_options["overlap_encoding"] = args.overlap_encoding
+    if args.symmetry_breaking:
+        model_options["symmetry_breaking"] = True
+    cells = bench_cells(args.setups, args.finalizers, args.ram_factors, args.timeout,
+                        model_options, args.events, args.size_encoding)
+    records = run_benchmarks(cells, args.workers)
+    with open(args.output, "w") as f:
+        json.dump(records, f, indent=4)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(records, json.load(f), args.threshold)
+        for (name, metric, old, new) in regressions:
+            print("Regression in {}: {} went from {} to {}".format(name, metric, old, new))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,129 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+import z3
+
+from solver import extract_layout, FixedArena
+from verify import check_layout
+
+
+def canonical_config(components, arenas, partition_name="sram", **options):
+    # Everything that decides the answer except the end of the partition being shrunk, which
+    # is kept apart so answers for one size can answer other sizes too. Address spaces and size
+    # encodings are left out as neither changes the answer
+    partitions = {}
+    for a in arenas:
+        if not isinstance(a, FixedArena):
+            partitions[a.partition.name] = a.partition
+
+    size = None
+    if partition_name in partitions:
+        p = partitions[partition_name]
+        size = p.end - p.start
+
+    config = {
+        "components": [{
+            "name": c.name,
+            "region_min_size": c.hw_config.region_min_size,
+            "region_count": c.hw_config.region_count,
+            "subregion_count": c.hw_config.subregion_count,
+            "complex_overlap_constraint": c.hw_config.complex_overlap_constraint,
+        } for c in sorted(components, key=lambda c: c.name)],
+        "partitions": [{
+            "name": p.name,
+            "start": p.start,
+            "end": None if p.name == partition_name else p.end,
+        } for p in sorted(partitions.values(), key=lambda p: p.name)],
+        "arenas": [{
+            "name": a.name,
+            "start": a.address_space.absolute(a.start) if isinstance(a, FixedArena) else None,
+            "partition": None if isinstance(a, FixedArena) else a.partition.name,
+            "size": a.size,
+            "readers": sorted(c.name for c in a.readers),
+            "writers": sorted(c.name for c in a.writers),
+        } for a in sorted(arenas, key=lambda a: a.name)],
+        "options": options,
+    }
+    return (config, size)
+
+
+def config_key(components, arenas, partition_name="sram", **options):
+    (config, size) = canonical_config(components, arenas, partition_name, **options)
+    serialised = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return (hashlib.sha256(serialised.encode("utf-8")).hexdigest(), size)
+
+
+def solver_statistics(s):
+    statistics = s.statistics()
+    return dict((key, statistics.get_key_value(key)) for key in statistics.keys())
+
+
+class ResultCache(object):
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.environ.get("MPU_AUTOCONFIG_CACHE", ".mpu_autoconfig_cache")
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, "results.sqlite"))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                                "key TEXT, size INTEGER, result TEXT, layout TEXT, "
+                                "statistics TEXT, created TEXT, PRIMARY KEY (key, size))")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def lookup(self, components, arenas, **options):
+        # More memory never breaks a layout, so a size is feasible if any smaller size was and
+        # infeasible if any larger size was not
+        (key, size) = config_key(components, arenas, **options)
+        if size is None:
+            row = self.connection.execute("SELECT result FROM results WHERE key = ?",
+                                          (key,)).fetchone()
+        else:
+            row = self.connection.execute("SELECT result FROM results WHERE key = ? AND ("
+                                          "(result = 'sat' AND size <= ?) OR "
+                                          "(result = 'unsat' AND size >= ?)) LIMIT 1",
+                                          (key, size, size)).fetchone()
+        if row is None:
+            return None
+        print('({:%Y-%m-%d %H:%M:%S}) Cached result for size {}: {}'.format(
+            datetime.datetime.now(), size, row[0]))
+        return z3.sat if row[0] == "sat" else z3.unsat
+
+    def store(self, components, arenas, result, s=None, **options):
+        if result not in [z3.sat, z3.unsat]:
+            return
+        (key, size) = config_key(components, arenas, **options)
+        layout = None
+        statistics = None
+        if s is not None:
+            statistics = solver_statistics(s)
+            if result == z3.sat:
+                try:
+                    layout = extract_layout(s.model(), components, arenas)
+                except z3.Z3Exception:
+                    layout = None
+                violations = [] if layout is None else check_layout(layout, components, arenas)
+                if violations:
+                    print("Not caching an invalid layout:", "; ".join(violations))
+                    layout = None
+        self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                                (key, size, str(result), json.dumps(layout),
+                                 json.dumps(statistics),
+                                 '{:%Y-%m-%d %H:%M:%S}'.format(datetime.datetime.now())))
+        self.connection.commit()
+
+    def layout(self, components, arenas, **options):
+        # The stored layout of the largest feasible size at most the given one, if it still
+        # holds for the given configuration
+        (key, size) = config_key(components, arenas, **options)
+        row = self.connection.execute("SELECT layout FROM results WHERE key = ? AND "
+                                      "result = 'sat' AND size <= ? AND layout != 'null' "
+                                      "ORDER BY size DESC LIMIT 1", (key, size)).fetchone()
+        if row is None:
+            return None
+        layout = json.loads(row[0])
+        return None if check_layout(layout, components, arenas) else layout
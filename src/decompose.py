@@ -0,0 +1,156 @@
+from z3 import And, Implies, ULE, sat, unsat
+
+from solver import arenas_ordered, model, narrowed_copy, regions_ordered, PartitionArena
+
+
+def access_classes(component, arenas):
+    classes = set()
+    for a in arenas:
+        readable = component in a.readers
+        writeable = component in a.writers
+        if readable or writeable:
+            classes.add((readable, writeable))
+    return classes
+
+
+def partition_territories(partitions):
+    # Splits the address space halfway between neighbouring partitions, regions confined to
+    # the territory of their partition can never overlap regions of another partition
+    ordered = sorted(partitions, key=lambda p: p.start)
+    for (p1, p2) in zip(ordered, ordered[1:]):
+        if p2.start < p1.end:
+            return None
+
+    territories = {}
+    low = None
+    for (p, following) in zip(ordered, ordered[1:] + [None]):
+        high = None if following is None else (p.end + following.start) // 2
+        territories[p] = (low, high)
+        low = high
+    return territories
+
+
+def split_region_budget(components, arenas, partitions):
+    # Every partition gets one region per distinct access class a component needs in it, the
+    # remaining regions go to the partitions where the component accesses the most arenas
+    budget = {}
+    for c in components:
+        accessed = {}
+        allocation = {}
+        for p in partitions:
+            partition_arenas = [a for a in arenas if a.partition is p]
+            accessed[p] = len([a for a in partition_arenas
+                               if c in a.readers or c in a.writers])
+            allocation[p] = len(access_classes(c, partition_arenas))
+
+        spare = c.hw_config.region_count - sum(allocation.values())
+        if spare < 0:
+            return None
+        while spare > 0:
+            p = max(partitions, key=lambda p: accessed[p] - allocation[p])
+            if accessed[p] - allocation[p] <= 0:
+                break
+            allocation[p] += 1
+            spare -= 1
+
+        first = 0
+        for p in partitions:
+            budget[(c.name, p.name)] = range(first, first + allocation[p])
+            first += allocation[p]
+    return budget
+
+
+def subproblem_key(p, components, arenas, budget, territory, model_options):
+    # Everything a subproblem is built from. Partitions with the same key, such as flash at
+    # every RAM size, have the same result
+    hw_configs = tuple((c.name, c.hw_config.region_min_size, c.hw_config.region_count,
+                        c.hw_config.subregion_count, c.hw_config.complex_overlap_constraint,
+                        c.hw_config.size_encoding, tuple(budget[(c.name, p.name)]))
+                       for c in components)
+    partition_arenas = tuple((a.name, a.size, tuple(c.name for c in a.readers),
+                              tuple(c.name for c in a.writers))
+                             for a in arenas if a.partition is p)
+    return (p.name, p.start, p.end, territory, hw_configs, partition_arenas,
+            tuple(sorted(model_options.items())))
+
+
+def decompose(components, arenas, results=None, **model_options):
+    if not all(isinstance(a, PartitionArena) for a in arenas):
+        return None
+    partitions = []
+    for a in arenas:
+        if a.partition not in partitions:
+            partitions.append(a.partition)
+    if len(partitions) < 2:
+        return None
+    if not all(isinstance(p.start, int) and isinstance(p.end, int) for p in partitions):
+        return None
+
+    territories = partition_territories(partitions)
+    if territories is None:
+        return None
+    budget = split_region_budget(components, arenas, partitions)
+    if budget is None:
+        return None
+
+    # Every subproblem only spans one partition, so it is encoded in the narrowest address
+    # space around it. Bounds of the territory outside that space already hold. Regions are
+    # only interchangeable within the budget of a partition, so that is where symmetry
+    # breaking orders them. Subproblems with a known result are not built again
+    key_options = dict(model_options)
+    breaking = model_options.pop("symmetry_breaking", False)
+    subproblems = []
+    for p in partitions:
+        key = subproblem_key(p, components, arenas, budget, territories[p], key_options)
+        if results is not None and key in results:
+            subproblems.append((p, key, None))
+            continue
+        (partition_components, partition_arenas) = narrowed_copy(
+            components, [a for a in arenas if a.partition is p])
+        s = model(partition_components, partition_arenas, **model_options)
+        if breaking:
+            s.add(arenas_ordered(partition_arenas))
+        (low, high) = territories[p]
+        for c in partition_components:
+            if breaking:
+                s.add(regions_ordered([c.regions[i] for i in budget[(c.name, p.name)]]))
+            space = c.hw_config.address_space
+            for (i, r) in enumerate(c.regions):
+                if i not in budget[(c.name, p.name)]:
+                    s.add(r.size == 0)
+                    continue
+                confined = []
+                if low is not None and space.contains(low):
+                    confined.append(ULE(space.offset(low), r.start))
+                if high is not None and space.contains(high):
+                    confined.append(ULE(r.end, space.offset(high)))
+                s.add(Implies(r.size != 0, And(confined)))
+        subproblems.append((p, key, s))
+    return subproblems
+
+
+def check_decomposed(components, arenas, solve=None, results=None, **model_options):
+    # The split only restricts the joint model, so a sat for every partition is a sat for the
+    # whole configuration, while anything else has to be confirmed on the joint model.
+    # results maps subproblem keys to what they returned before, it is filled as they are
+    # solved
+    if solve is None:
+        def solve(s):
+            return s.check()
+
+    results = {} if results is None else results
+    subproblems = decompose(components, arenas, results, **model_options)
+    if subproblems is not None:
+        # Known results first, a known failure spares solving the others
+        for (p, key, s) in sorted(subproblems, key=lambda subproblem: subproblem[2] is not None):
+            if s is None:
+                result = results[key]
+            else:
+                result = solve(s)
+                if result in [sat, unsat]:
+                    results[key] = result
+            if not result == sat:
+                break
+        else:
+            return sat
+    return solve(model(components, arenas, **model_options))
@@ -0,0 +1,388 @@
+#!/usr/local/bin/python3
+import datetime
+
+import z3
+from z3 import And, Bool, BitVec, BoolVal, Implies, Int, Not, Or, ULE, ULT, substitute_vars, unsat
+
+from main import get_setup, get_finalizer
+from solver import arenas_disjoint, connective, copy_config, interchangeable_arenas, model, \
+    odd_even_merge_pairs, FixedArena
+
+ASSOCIATIVE = [z3.Z3_OP_AND, z3.Z3_OP_OR, z3.Z3_OP_ADD, z3.Z3_OP_MUL, z3.Z3_OP_BADD,
+               z3.Z3_OP_BMUL]
+COMMUTATIVE = ASSOCIATIVE + [z3.Z3_OP_EQ, z3.Z3_OP_DISTINCT]
+
+
+def abstract_bounds(components, arenas):
+    # The encodings only compare bounds against each other, so proving them equivalent for
+    # free bounds proves them equivalent for the bounds the model actually uses
+    for c in components:
+        for r in c.regions:
+            for sr in r.subregions:
+                sr.start = BitVec(sr.name + "/start", 32)
+                sr.end = BitVec(sr.name + "/end", 32)
+    for a in arenas:
+        if not isinstance(a, FixedArena):
+            a.end = BitVec(a.name + "/end", 32)
+            if not isinstance(a.partition.end, int):
+                a.partition.end = BitVec(a.partition.name + "/end", 32)
+
+
+def to_integer(expr, variables):
+    # Only unsigned comparisons between bit-vector constants remain after abstracting the
+    # bounds, which linear integer arithmetic decides far faster than bit-blasting
+    if z3.is_bv_value(expr):
+        return expr.as_long()
+    if z3.is_bv(expr) and z3.is_const(expr):
+        name = expr.decl().name()
+        if name not in variables:
+            variables[name] = Int(name)
+        return variables[name]
+    children = [to_integer(child, variables) for child in expr.children()]
+    if z3.is_app_of(expr, z3.Z3_OP_ULEQ):
+        return children[0] <= children[1]
+    elif z3.is_app_of(expr, z3.Z3_OP_ULT):
+        return children[0] < children[1]
+    elif z3.is_app_of(expr, z3.Z3_OP_UGEQ):
+        return children[0] >= children[1]
+    elif z3.is_app_of(expr, z3.Z3_OP_UGT):
+        return children[0] > children[1]
+    elif z3.is_and(expr):
+        return And(children)
+    elif z3.is_or(expr):
+        return Or(children)
+    elif z3.is_not(expr):
+        return Not(children[0])
+    elif z3.is_implies(expr):
+        return Implies(children[0], children[1])
+    elif z3.is_eq(expr):
+        return children[0] == children[1]
+    elif z3.is_app_of(expr, z3.Z3_OP_ITE):
+        return z3.If(children[0], children[1], children[2])
+    elif z3.is_add(expr):
+        return z3.Sum(children)
+    elif z3.is_le(expr):
+        return children[0] <= children[1]
+    elif len(children) == 0:
+        return expr
+    raise ValueError("Cannot translate {} to integers".format(expr.decl()))
+
+
+def witnesses(component, arena=None):
+    # If a quantified access constraint is violated anywhere, it is violated at the start of
+    # the arena or at one of the subregion bounds of the component
+    terms = []
+    if arena is not None:
+        terms.append(arena.start)
+    for r in component.regions:
+        for sr in r.subregions:
+            terms += [sr.start, sr.end]
+    return terms
+
+
+def last_covered_bound(arena, subregions, addr):
+    # Splits on the last bound at or below addr from which coverage propagates: the arena
+    # start or the highest subregion end inside the arena. Such a bound always exists, so the
+    # cases cover every counterexample, and each one spares the solver the induction
+    bound = BitVec("bound", 32)
+    inside = []
+    candidates = [bound == arena.start]
+    for (accessible, sr) in subregions:
+        inside.append((And(accessible, sr.enabled, ULT(arena.start, sr.end), ULE(sr.end, addr)),
+                       sr.end))
+        candidates.append(And(inside[-1][0], bound == sr.end))
+    highest = [ULE(arena.start, bound)] + [Implies(i, ULE(end, bound)) for (i, end) in inside]
+    return [And([case] + highest) for case in candidates]
+
+
+def access_lemmas(arena, component):
+    return {
+        "readable_by": lambda addr: last_covered_bound(arena, component.readable_subregions(),
+                                                       addr),
+        "writeable_by": lambda addr: last_covered_bound(arena, component.writeable_subregions(),
+                                                        addr),
+    }
+
+
+def access_constraint_pairs(components, arenas, seen=None):
+    # Every access constraint only depends on the arena bounds and the regions of one
+    # component, so arenas of the same kind and equal hardware configurations need one proof
+    if seen is None:
+        seen = set()
+    for a in arenas:
+        if isinstance(a, FixedArena):
+            shape = (a.start, a.end)
+        else:
+            shape = "partition"
+        for c in components:
+            hw = c.hw_config
+            key = (shape, hw.region_count, hw.subregion_count)
+            if key in seen:
+                continue
+            seen.add(key)
+            lemmas = access_lemmas(a, c)
+            for kind in ["readable_by", "not_readable_by", "writeable_by", "not_writeable_by"]:
+                check = getattr(a, kind)
+                yield ("{}.{}({})".format(a.name, kind, c.name), check(c), check(c, True),
+                       witnesses(c, a), lemmas.get(kind))
+
+    for c in components:
+        hw = c.hw_config
+        key = ("only_single_enabled_region", hw.region_count, hw.subregion_count)
+        if hw.complex_overlap_constraint and key not in seen:
+            seen.add(key)
+            yield ("{}.only_single_enabled_region".format(c.name),
+                   c.only_single_enabled_region(), c.only_single_enabled_region_qf(), witnesses(c),
+                   None)
+
+
+def instantiate(quantified, term):
+    if z3.is_not(quantified):
+        return Not(substitute_vars(quantified.arg(0).body(), term))
+    return substitute_vars(quantified.body(), term)
+
+
+def prove_equivalent(pairs, timeout=None):
+    # Both directions are proven without quantifiers: the quantifier free encoding implies
+    # the body for a fresh address, and the body at all witnesses implies the encoding
+    results = []
+    for (name, quantified, quantifier_free, terms, lemma) in pairs:
+        addr = BitVec("witness", 32)
+        cases = [BoolVal(True)] if lemma is None else lemma(addr)
+        directions = [(And(quantifier_free, Not(instantiate(quantified, addr))), cases),
+                      (And([instantiate(quantified, t) for t in terms] + [Not(quantifier_free)]),
+                       [BoolVal(True)])]
+        result = unsat
+        for (counterexample, cases) in directions:
+            variables = {}
+            s = z3.Solver()
+            if timeout is not None:
+                s.set(timeout=timeout)
+            s.add(to_integer(counterexample, variables))
+            for case in cases:
+                s.push()
+                s.add(to_integer(case, variables))
+                for v in variables.values():
+                    s.add(0 <= v, v < 2 ** 32)
+                result = s.check()
+                s.pop()
+                if not result == unsat:
+                    break
+            if not result == unsat:
+                break
+        results.append((name, result == unsat, result))
+    return results
+
+
+def overlap_encoding_pairs(arenas):
+    # The encodings only have to agree on arenas that are consistent on their own, the others
+    # are ruled out by the model anyway
+    context = [c for a in arenas for c in a.is_consistent()]
+    yield ("partition", arenas_disjoint(arenas), arenas_disjoint(arenas, "partition"), context)
+
+
+def prove_sorting_network(n, timeout=None):
+    # The sorted encoding is equivalent as soon as the network sorts: it only ever swaps
+    # arenas, and non empty arenas sorted by their start are disjoint iff neighbours are. By
+    # the 0-1 principle it sorts everything if it sorts all inputs of zeros and ones, which
+    # unlike sorting bit-vectors is easy to decide
+    keys = [Bool("key_" + str(i)) for i in range(n)]
+    for (i, j) in odd_even_merge_pairs(n):
+        (keys[i], keys[j]) = (And(keys[i], keys[j]), Or(keys[i], keys[j]))
+    s = z3.Solver()
+    if timeout is not None:
+        s.set(timeout=timeout)
+    s.add(Or([And(k1, Not(k2)) for (k1, k2) in zip(keys, keys[1:])]))
+    result = s.check()
+    return ("sorted({})".format(n), result == unsat, result)
+
+
+def prove_overlap_encodings(pairs, timeout=None):
+    results = []
+    for (name, pairwise, encoded, context) in pairs:
+        variables = {}
+        s = z3.Solver()
+        if timeout is not None:
+            s.set(timeout=timeout)
+        s.add(to_integer(And(context), variables))
+        s.add(to_integer(Or(And(pairwise, Not(encoded)), And(Not(pairwise), encoded)), variables))
+        for v in variables.values():
+            s.add(0 <= v, v < 2 ** 32)
+        result = s.check()
+        results.append((name, result == unsat, result))
+    return results
+
+
+class CanonicalForms(object):
+    # Numbers terms so that two terms get the same number iff they only differ in the order
+    # and nesting of the arguments of associative and commutative operators. Terms are hash
+    # consed bottom up, shared subterms are only numbered once. Walks the raw ASTs, wrapping
+    # every node in a Python object took most of the time
+    def __init__(self):
+        self.ctx = z3.main_ctx().ref()
+        self.numbers = {}
+        self.flattened = {}
+        self.seen = {}
+        # Keeps every numbered term alive, so ids are never handed to other terms
+        self.roots = []
+
+    def children(self, ast):
+        ctx = self.ctx
+        kind = z3.Z3_get_ast_kind(ctx, ast)
+        if kind == z3.Z3_QUANTIFIER_AST:
+            return [z3.Z3_get_quantifier_body(ctx, ast)]
+        if kind != z3.Z3_APP_AST:
+            return []
+        app = z3.Z3_to_app(ctx, ast)
+        return [z3.Z3_get_app_arg(ctx, app, i) for i in range(z3.Z3_get_app_num_args(ctx, app))]
+
+    def node(self, ast, children):
+        ctx = self.ctx
+        kind = z3.Z3_get_ast_kind(ctx, ast)
+        if kind == z3.Z3_QUANTIFIER_AST:
+            sorts = tuple(z3.Z3_get_sort_id(ctx, z3.Z3_get_quantifier_bound_sort(ctx, ast, i))
+                          for i in range(z3.Z3_get_quantifier_num_bound(ctx, ast)))
+            return (None, "quantifier", z3.Z3_is_quantifier_forall(ctx, ast), sorts) + \
+                tuple(children)
+        if not children:
+            # Leaves are hash consed by z3 itself
+            return (None, "leaf", z3.Z3_get_ast_id(ctx, ast), None)
+        decl = z3.Z3_get_app_decl(ctx, z3.Z3_to_app(ctx, ast))
+        op = z3.Z3_get_decl_kind(ctx, decl)
+        if op in ASSOCIATIVE:
+            children = [grandchild for child in children
+                        for grandchild in self.flattened.get((op, child), [child])]
+        if op in COMMUTATIVE:
+            children = sorted(children)
+        decl_id = z3.Z3_get_ast_id(ctx, z3.Z3_func_decl_to_ast(ctx, decl))
+        return (op, "app", decl_id, None) + tuple(children)
+
+    def number(self, root):
+        self.roots.append(root)
+        ctx = self.ctx
+        stack = [(root.as_ast(), False)]
+        while stack:
+            (ast, expanded) = stack.pop()
+            key = z3.Z3_get_ast_id(ctx, ast)
+            if key in self.seen:
+                continue
+            children = self.children(ast)
+            if not expanded:
+                stack.append((ast, True))
+                stack += [(child, False) for child in children]
+                continue
+            node = self.node(ast, [self.seen[z3.Z3_get_ast_id(ctx, child)]
+                                   for child in children])
+            number = self.numbers.setdefault(node, len(self.numbers))
+            if node[0] in ASSOCIATIVE:
+                self.flattened[(node[0], number)] = list(node[4:])
+            self.seen[key] = number
+        return self.seen[z3.Z3_get_ast_id(ctx, root.as_ast())]
+
+
+def region_variables(r):
+    if r.hw_config.size_encoding == "exponent":
+        variables = [r.exponent, r.index, r.allocated]
+    else:
+        variables = [r.start, r.size]
+    return variables + [r.readable, r.writeable] + [sr.enabled for sr in r.subregions]
+
+
+def symmetries(components, arenas):
+    # Swaps of neighbouring regions of a component and of neighbouring interchangeable
+    # arenas, as pairs of variables exchanged. Adjacent swaps generate every permutation
+    def swap(variables1, variables2):
+        return list(zip(variables1, variables2)) + list(zip(variables2, variables1))
+
+    for c in components:
+        for (r1, r2) in zip(c.regions, c.regions[1:]):
+            yield ("{} <-> {}".format(r1.name, r2.name),
+                   swap(region_variables(r1), region_variables(r2)))
+    for group in interchangeable_arenas(arenas):
+        for (a1, a2) in zip(group, group[1:]):
+            yield ("{} <-> {}".format(a1.name, a2.name), swap([a1.start], [a2.start]))
+
+
+def prove_symmetries(components, arenas, **model_options):
+    # The symmetry breaking constraints keep the result if every layout can be permuted into
+    # one they allow. Sorting the used regions of a component by start and size and the
+    # interchangeable arenas by start gives such a layout, so it is enough that the model
+    # stays the same under every swap: the swapped model may only differ from the original
+    # in the order of the arguments of commutative operators. Only the pairwise overlap
+    # encoding is checked, the others are proven equivalent to it above
+    formula = connective(z3.Z3_mk_and, model(components, arenas, **model_options).assertions())
+    forms = CanonicalForms()
+    original = forms.number(formula)
+    results = []
+    for (name, pairs) in symmetries(components, arenas):
+        swapped = z3.substitute(formula, *pairs)
+        results.append((name, forms.number(swapped) == original))
+    return results
+
+
+def check_symmetries():
+    all_proven = True
+    for setup in range(1, 6):
+        for finalizer in range(1, 4):
+            for complex_overlap_constraint in [False, True]:
+                for quantifier_free in [False, True]:
+                    print('({:%Y-%m-%d %H:%M:%S}) Symmetries of setup {}, finalizer {}, '
+                          'complex {}, quantifier free {}'.format(
+                              datetime.datetime.now(), setup, finalizer,
+                              complex_overlap_constraint, quantifier_free))
+                    ram_size = BitVec("ram_size", 32)
+                    (components, arenas) = get_finalizer(finalizer)(
+                        get_setup(setup)(ram_size, complex_overlap_constraint))
+                    for size_encoding in ["bitvector", "exponent"]:
+                        (copied_components, copied_arenas) = copy_config(
+                            components, arenas, size_encoding=size_encoding)
+                        for (name, proven) in prove_symmetries(
+                                copied_components, copied_arenas,
+                                quantifier_free=quantifier_free):
+                            if not proven:
+                                all_proven = False
+                                print("Not proven: symmetry", name, size_encoding)
+    return all_proven
+
+
+def check_shipped_setups(timeout=None):
+    all_proven = True
+    seen = set()
+    network_sizes = set()
+    for setup in range(1, 6):
+        for finalizer in range(1, 4):
+            for complex_overlap_constraint in [False, True]:
+                print('({:%Y-%m-%d %H:%M:%S}) Setup {}, finalizer {}, complex {}'.format(
+                    datetime.datetime.now(), setup, finalizer, complex_overlap_constraint))
+                ram_size = BitVec("ram_size", 32)
+                (components, arenas) = get_finalizer(finalizer)(
+                    get_setup(setup)(ram_size, complex_overlap_constraint))
+                abstract_bounds(components, arenas)
+                pairs = access_constraint_pairs(components, arenas, seen)
+                for (name, proven, result) in prove_equivalent(pairs, timeout):
+                    if not proven:
+                        all_proven = False
+                        print("Not proven:", name, result)
+                if complex_overlap_constraint:
+                    continue
+                pairs = overlap_encoding_pairs(arenas)
+                results = prove_overlap_encodings(pairs, timeout)
+                if len(arenas) not in network_sizes:
+                    network_sizes.add(len(arenas))
+                    results.append(prove_sorting_network(len(arenas), timeout))
+                for (name, proven, result) in results:
+                    if not proven:
+                        all_proven = False
+                        print("Not proven: overlap encoding", name, result)
+    return all_proven
+
+
+if __name__ == '__main__':
+    if check_shipped_setups():
+        print("Quantified and quantifier free encodings and all overlap encodings are equivalent")
+    else:
+        print("Some encodings could not be proven equivalent")
+    if check_symmetries():
+        print("Symmetry breaking keeps the result of every shipped setup")
+    else:
+        print("Some symmetries could not be proven")
@@ -0,0 +1,227 @@
+from solver import is_pow_of_2, FixedArena, PartitionArena
+from verify import check_layout
+
+
+class Block(object):
+    # Arenas of one partition that every component may access in the same way are laid out
+    # back to back and covered by a single region per accessing component
+    def __init__(self, partition, readers, writers):
+        self.partition = partition
+        self.readers = readers
+        self.writers = writers
+        self.arenas = []
+        self.start = None
+
+    def accessors(self):
+        return self.readers | self.writers
+
+    def size(self):
+        return sum(a.size for a in self.arenas)
+
+    def granule(self):
+        # The smallest subregion size that covers the block with the subregions of one region
+        accessors = list(self.accessors())
+        if not accessors:
+            return 1
+        hw_config = accessors[0].hw_config
+        granule = 1
+        while granule * hw_config.subregion_count < hw_config.region_min_size or \
+                -(-self.size() // granule) > hw_config.subregion_count:
+            granule *= 2
+        return granule
+
+    def padded_size(self):
+        granule = self.granule()
+        return -(-self.size() // granule) * granule
+
+    def region_size(self):
+        accessors = list(self.accessors())
+        if not accessors:
+            return None
+        return self.granule() * accessors[0].hw_config.subregion_count
+
+
+def align_up(x, alignment):
+    return -(-x // alignment) * alignment
+
+
+def covering_region(hw_config, start, end):
+    # The smallest naturally aligned region holding a fixed span, with the subregions over it
+    # enabled. The enabled subregions may reach past the span
+    granule = 1
+    while True:
+        size = granule * hw_config.subregion_count
+        base = start - start % size
+        if size >= hw_config.region_min_size and end <= base + size:
+            break
+        granule *= 2
+    first = (start - base) // granule
+    last = -(-(end - base) // granule)
+    return (base, size, [first <= i < last for i in range(hw_config.subregion_count)])
+
+
+def group_blocks(arenas):
+    # Fixed arenas are already placed, they are not packed with the others
+    blocks = {}
+    for a in arenas:
+        if isinstance(a, FixedArena):
+            continue
+        key = (a.partition, frozenset(a.readers), frozenset(a.writers))
+        if key not in blocks:
+            blocks[key] = Block(a.partition, key[1], key[2])
+        blocks[key].arenas.append(a)
+    return list(blocks.values())
+
+
+def place(block, placed, regions, complex_overlap_constraint):
+    # First fit: move up past whatever is in the way until the block fits in one region
+    granule = block.granule()
+    padded_size = block.padded_size()
+    region_size = block.region_size()
+    start = align_up(block.partition.start, granule)
+    while True:
+        end = start + padded_size
+        if region_size is not None:
+            base = start - start % region_size
+            if end > base + region_size:
+                start = base + region_size
+                continue
+
+        in_the_way = [b for (a, b) in placed if a < end and start < b]
+        if not complex_overlap_constraint and region_size is not None:
+            # The region spans the whole window whatever the start within it, so a region in
+            # the way moves the block past the window as well
+            clashes = [r["start"] + r["size"] for c in block.accessors() for r in regions[c]
+                       if r["start"] < base + region_size and base < r["start"] + r["size"]]
+            if clashes:
+                in_the_way += clashes + [base + region_size]
+        if not in_the_way:
+            return start
+        start = align_up(max(in_the_way), granule)
+
+
+def greedy_layout(components, arenas):
+    # First fit decreasing packing of arenas into naturally aligned power of two regions with
+    # subregions enabled only over the arenas of the region, or None if it runs out of regions
+    blocks = group_blocks(arenas)
+    for b in blocks:
+        if not isinstance(b.partition.start, int):
+            return None
+    for c in components:
+        if not is_pow_of_2(c.hw_config.subregion_count):
+            return None
+
+    # Fixed arenas come first, with a region for each accessor and whatever the enabled
+    # subregions reach kept free of other arenas
+    regions = dict((c, []) for c in components)
+    placed = []
+    layout = {"arenas": [], "components": []}
+    for a in arenas:
+        if not isinstance(a, FixedArena):
+            continue
+        (start, end) = (a.address_space.absolute(a.start), a.address_space.absolute(a.end))
+        layout["arenas"].append({"name": a.name, "start": start, "end": end})
+        placed.append((start, end))
+        for c in set(a.readers) | set(a.writers):
+            (base, size, subregions) = covering_region(c.hw_config, start, end)
+            granule = size // c.hw_config.subregion_count
+            placed.append((base + subregions.index(True) * granule,
+                           base + (len(subregions) - subregions[::-1].index(True)) * granule))
+            regions[c].append({
+                "start": base,
+                "size": size,
+                "readable": c in a.readers,
+                "writeable": c in a.writers,
+                "subregions": subregions,
+            })
+
+    for b in sorted(blocks, key=lambda b: (-b.granule(), -b.padded_size())):
+        complex_overlap_constraint = all(c.hw_config.complex_overlap_constraint
+                                         for c in b.accessors())
+        b.start = place(b, placed, regions, complex_overlap_constraint)
+        placed.append((b.start, b.start + b.padded_size()))
+
+        region_size = b.region_size()
+        for c in b.accessors():
+            base = b.start - b.start % region_size
+            first = (b.start - base) // b.granule()
+            last = first + b.padded_size() // b.granule()
+            regions[c].append({
+                "start": base,
+                "size": region_size,
+                "readable": c in b.readers,
+                "writeable": c in b.writers,
+                "subregions": [first <= i < last for i in range(c.hw_config.subregion_count)],
+            })
+
+    for b in blocks:
+        start = b.start
+        for a in b.arenas:
+            layout["arenas"].append({"name": a.name, "start": start, "end": start + a.size})
+            start += a.size
+    for c in components:
+        if len(regions[c]) > c.hw_config.region_count:
+            return None
+        layout["components"].append({"name": c.name, "regions": regions[c]})
+    return layout
+
+
+def layout_values(layout, components, arenas):
+    arena_layouts = dict((a["name"], a) for a in layout["arenas"])
+    component_layouts = dict((c["name"], c) for c in layout["components"])
+    values = []
+    for a in arenas:
+        if not isinstance(a.start, int):
+            values.append((a.start, a.address_space.offset(arena_layouts[a.name]["start"])))
+    for c in components:
+        space = c.hw_config.address_space
+        region_layouts = component_layouts[c.name]["regions"]
+        for (i, r) in enumerate(c.regions):
+            if i < len(region_layouts):
+                region = dict(region_layouts[i], start=space.offset(region_layouts[i]["start"]))
+            else:
+                region = {"start": 0, "size": 0, "readable": False, "writeable": False,
+                          "subregions": [False] * len(r.subregions)}
+            values += r.assignment(region["start"], region["size"])
+            values += [(r.readable, region["readable"]), (r.writeable, region["writeable"])]
+            for (sr, enabled) in zip(r.subregions, region["subregions"]):
+                values.append((sr.enabled, enabled))
+    return values
+
+
+def verify_layout(layout, components, arenas):
+    return not check_layout(layout, components, arenas)
+
+
+def warm_start(s, layout, components, arenas):
+    # Initial values only steer the search, older z3 versions simply go without them
+    if hasattr(s, "set_initial_value"):
+        for (term, value) in layout_values(layout, components, arenas):
+            s.set_initial_value(term, value)
+
+
+def layout_size(layout, arenas, partition_name="sram"):
+    # The smallest size of the partition the layout fits in, as arenas end below its end
+    partition_arenas = [a for a in arenas
+                        if isinstance(a, PartitionArena) and a.partition.name == partition_name]
+    if not partition_arenas:
+        return None
+    names = set(a.name for a in partition_arenas)
+    ends = [a["end"] for a in layout["arenas"] if a["name"] in names]
+    return max(ends) - partition_arenas[0].partition.start + 1
+
+
+def heuristic_size(config_generator, complex_overlap_constraint, partition_name="sram"):
+    # The smallest size of the partition the greedy layout fits in, once it was verified
+    (components, arenas) = config_generator(0, complex_overlap_constraint)
+    layout = greedy_layout(components, arenas)
+    if layout is None:
+        return None
+
+    size = layout_size(layout, arenas, partition_name)
+    if size is None:
+        return None
+    (components, arenas) = config_generator(size, complex_overlap_constraint)
+    if not verify_layout(layout, components, arenas):
+        return None
+    return (size, layout)
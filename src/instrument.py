@@ -0,0 +1,66 @@
+import datetime
+import json
+import time
+
+import z3
+
+from cache import solver_statistics
+from solver import model
+
+
+def ast_size(constraints):
+    # Shared subterms are counted once, as z3 stores them once
+    seen = set()
+    todo = [c for c in constraints if z3.is_expr(c)]
+    while todo:
+        expr = todo.pop()
+        if expr.get_id() in seen:
+            continue
+        seen.add(expr.get_id())
+        if z3.is_quantifier(expr):
+            todo.append(expr.body())
+        else:
+            todo += expr.children()
+    return len(seen)
+
+
+class JsonLinesSink(object):
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, event):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+
+
+class Instrumentation(object):
+    # Events are dicts handed to the sink, any callable taking one will do
+    def __init__(self, sink):
+        self.sink = sink
+
+    def emit(self, event, **fields):
+        fields["event"] = event
+        fields["timestamp"] = '{:%Y-%m-%d %H:%M:%S.%f}'.format(datetime.datetime.now())
+        self.sink(fields)
+
+    def model(self, components, arenas, context=None, **model_options):
+        # The model solver.model builds, with an event for every constraint family. The
+        # context is added to every event
+        context = {} if context is None else context
+
+        def build(family, build_family):
+            started = time.time()
+            constraints = build_family()
+            build_time = time.time() - started
+            self.emit("build", family=family, build_time=build_time,
+                      constraints=len(constraints), ast_size=ast_size(constraints), **context)
+            return constraints
+
+        return model(components, arenas, build=build, **model_options)
+
+    def check(self, s, solve=None, **context):
+        started = time.time()
+        result = s.check() if solve is None else solve(s)
+        self.emit("check", result=str(result), solve_time=time.time() - started,
+                  statistics=solver_statistics(s), **context)
+        return result
@@ -1,8 +1,16 @@
 #!/usr/local/bin/python3
+import functools
+
 from z3 import set_option
 
-from shrinker import check_fragmentation
+from cache import ResultCache
+from parallel import check_fragmentation_concurrent, test_shrinking_parallel
+from portfolio import Portfolio
+from shrinker import check_fragmentation, check_fragmentation_anytime, test_shrinking, \
+    test_shrinking_incremental, test_shrinking_optimise
+from smtlib import test_shrinking_smtlib
 from vms import \
+    ConfigGenerator, \
     configure_setup_with_io_manager, \
     configure_setup_with_io_and_chaining, \
     configure_setup_with_io_and_sharing, \
@@ -65,19 +73,105 @@ def get_finalizer(i):
         return configure_setup_with_io_and_sharing
 
 
+def get_shrinker(i):
+    if i == 1:
+        return test_shrinking
+    elif i == 2:
+        return test_shrinking_incremental
+    elif i == 3:
+        return test_shrinking_optimise
+    elif i == 4:
+        return test_shrinking_parallel
+    elif i == 6:
+        return functools.partial(test_shrinking, decomposed=True)
+    elif i == 8:
+        return test_shrinking_smtlib
+    elif i == 9:
+        return functools.partial(test_shrinking, two_stage=True)
+
+
+def get_encoding(i):
+    if i == 1:
+        return {}
+    elif i == 2:
+        return {"quantifier_free": True}
+    elif i == 3:
+        return {"quantifier_free": True, "overlap_encoding": "partition"}
+    elif i == 4:
+        return {"quantifier_free": True, "overlap_encoding": "sorted"}
+    elif i == 5:
+        return {"quantifier_free": True, "symmetry_breaking": True}
+
+
+# Only these searches take a portfolio, the others build and check their models elsewhere
+PORTFOLIO_SEARCHES = [1, 2, 6, 9]
+
+
+def get_portfolio(i):
+    if i == 1:
+        return None
+    elif i == 2:
+        return Portfolio(history="portfolio_history.json")
+
+
+# Only these searches read and fill the result cache
+CACHE_SEARCHES = [1, 6, 8, 9]
+
+
+def get_cache(i):
+    if i == 1:
+        return None
+    elif i == 2:
+        return ResultCache()
+
+
+# Only these searches probe sizes in worker processes
+PARALLEL_SEARCHES = [4, 5]
+
+
 if __name__ == '__main__':
     set_option(max_args=10000000, max_lines=1000000, max_depth=10000000, max_visited=1000000)
 
     print("Enter setup selection (1 - 5):")
-    setup = input()
+    setup = int(input())
 
     print("Enter shared memory selection (1 - 3):")
-    finalizer = input()
-
-    setup_function = get_setup(setup)
-    finalizer_function = get_finalizer(finalizer)
-
-    def config_generator(ram_size, complex_overlap_constraint):
-        return finalizer_function(setup_function(ram_size, complex_overlap_constraint))
-
-    check_fragmentation(config_generator)
+    finalizer = int(input())
+
+    print("Enter search selection (1 - 9):")
+    shrinker = int(input())
+
+    print("Enter encoding selection (1 - 5):")
+    encoding = int(input())
+
+    portfolio = None
+    if shrinker in PORTFOLIO_SEARCHES:
+        print("Enter solver selection (1 - 2):")
+        portfolio = get_portfolio(int(input()))
+
+    cache = None
+    if shrinker in CACHE_SEARCHES:
+        print("Enter cache selection (1 - 2):")
+        cache = get_cache(int(input()))
+
+    config_generator = ConfigGenerator(get_setup(setup), get_finalizer(finalizer))
+    options = get_encoding(encoding)
+    if portfolio is not None:
+        options["portfolio"] = portfolio
+    if cache is not None:
+        options["cache"] = cache
+    if shrinker in PARALLEL_SEARCHES:
+        print("Enter worker count and time limit per probe (seconds), 0 for the defaults:")
+        options["workers"] = int(input()) or None
+        options["timeout"] = float(input()) or None
+
+    if shrinker == 5:
+        check_fragmentation_concurrent(config_generator, **options)
+    elif shrinker == 7:
+        print("Enter time budget per check and in total (seconds):")
+        check_timeout = float(input())
+        budget = float(input())
+        check_fragmentation_anytime(config_generator, check_timeout, budget,
+                                    **get_encoding(encoding))
+    else:
+        check_fragmentation(config_generator, get_shrinker(shrinker), **options)
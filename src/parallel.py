@@ -0,0 +1,205 @@
+import datetime
+import multiprocessing
+import multiprocessing.connection
+
+from precheck import infeasibility_reasons
+from shrinker import size_bounds
+from solver import model
+
+
+def check_size_worker(config_generator, size, complex_overlap_constraint, timeout, model_options,
+                      connection):
+    (components, arenas) = config_generator(size, complex_overlap_constraint)
+    if infeasibility_reasons(components, arenas):
+        connection.send("unsat")
+    else:
+        s = model(components, arenas, **model_options)
+        if timeout is not None:
+            s.set(timeout=int(timeout * 1000))
+        connection.send(str(s.check()))
+    connection.close()
+
+
+class SizeSearch(object):
+    def __init__(self, max_size, min_size):
+        self.max_size = max_size
+        self.max_size_verified = False
+        self.smallest_working_size = max_size
+        self.largest_failing_size = min_size - 1
+        self.undecided = set()
+
+    def is_done(self):
+        return self.max_size_verified and \
+            (self.smallest_working_size - self.largest_failing_size) <= 1
+
+    def is_relevant(self, size):
+        if size == self.max_size and not self.max_size_verified:
+            return True
+        return self.largest_failing_size < size < self.smallest_working_size
+
+    def next_probe(self, probed):
+        # An undecided size that still matters stops the search once the running probes are
+        # done, unless one of them makes it irrelevant
+        if any(self.is_relevant(size) for size in self.undecided):
+            return None
+        probed = set(probed)
+        if not self.max_size_verified and self.max_size not in probed:
+            return self.max_size
+
+        # Split the widest stretch of sizes that is neither decided nor being probed
+        bounds = sorted(set([self.largest_failing_size, self.smallest_working_size] +
+                            [size for size in probed if self.is_relevant(size)]))
+        (low, high) = max(zip(bounds, bounds[1:]), key=lambda gap: gap[1] - gap[0])
+        if high - low <= 1:
+            return None
+        return (low + high) // 2
+
+    def record(self, size, result):
+        if result == "sat":
+            self.max_size_verified = True
+            self.smallest_working_size = min(self.smallest_working_size, size)
+        elif result == "unsat":
+            if size == self.max_size:
+                raise ValueError("Largest size not large enough! (Result was {})".format(result))
+            self.largest_failing_size = max(self.largest_failing_size, size)
+        else:
+            self.undecided.add(size)
+
+    def result(self):
+        if not self.max_size_verified:
+            raise ValueError("Largest size not large enough! (Result was unknown)")
+        if not self.is_done():
+            raise ValueError("s.check() was unknown")
+        return self.smallest_working_size
+
+
+class ProbePool(object):
+    def __init__(self, workers=None, timeout=None):
+        # Every probe gets its own process and pipe, so probes that no longer matter can be
+        # killed without disturbing the others. Processes are spawned rather than forked, so
+        # config generators have to be picklable
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.timeout = timeout
+        self.running = {}
+
+    def has_capacity(self):
+        return len(self.running) < self.workers
+
+    def start(self, config_generator, size, complex_overlap_constraint, model_options):
+        (receiver, sender) = self.context.Pipe(duplex=False)
+        process = self.context.Process(target=check_size_worker,
+                                       args=(config_generator, size, complex_overlap_constraint,
+                                             self.timeout, model_options, sender))
+        process.start()
+        sender.close()
+        self.running[(complex_overlap_constraint, size)] = (process, receiver)
+
+    def wait(self):
+        receivers = [receiver for (process, receiver) in self.running.values()]
+        ready = multiprocessing.connection.wait(receivers)
+        finished = []
+        for (key, (process, receiver)) in list(self.running.items()):
+            if receiver not in ready:
+                continue
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = "unknown"
+            del self.running[key]
+            process.join()
+            receiver.close()
+            finished.append((key, result))
+        return finished
+
+    def cancel(self, should_cancel):
+        for key in [key for key in self.running if should_cancel(key)]:
+            (process, receiver) = self.running.pop(key)
+            process.terminate()
+            process.join()
+            receiver.close()
+
+    def close(self):
+        self.cancel(lambda key: True)
+
+
+def test_shrinking_parallel(config_generator, max_size, min_size, complex_overlap_constraint,
+                            workers=None, timeout=None, **model_options):
+    print('({:%Y-%m-%d %H:%M:%S}) Starting parallel shrinking test!'.format(
+        datetime.datetime.now()))
+
+    search = SizeSearch(max_size, min_size)
+    pool = ProbePool(workers, timeout)
+    try:
+        while not search.is_done():
+            while pool.has_capacity():
+                size = search.next_probe([size for (c, size) in pool.running])
+                if size is None:
+                    break
+                pool.start(config_generator, size, complex_overlap_constraint, model_options)
+            if not pool.running:
+                break
+
+            for ((c, size), result) in pool.wait():
+                print('({:%Y-%m-%d %H:%M:%S}) Size {}: {}'.format(datetime.datetime.now(), size,
+                                                                  result))
+                search.record(size, result)
+            pool.cancel(lambda key: not search.is_relevant(key[1]))
+            print('({:%Y-%m-%d %H:%M:%S}) Current parameters:'.format(datetime.datetime.now()),
+                  search.smallest_working_size, search.largest_failing_size)
+    finally:
+        pool.close()
+    return search.result()
+
+
+def check_fragmentation_concurrent(config_generator, workers=None, timeout=None,
+                                   **model_options):
+    (min_size, lower_bound, max_size) = size_bounds(config_generator)
+
+    print("Min size", min_size, "Lower bound", lower_bound, "Max size", max_size)
+
+    # The complex overlap constraint is a relaxation of the non complex one: a size that works
+    # without it works with it, and a size that fails with it fails without it. Both searches
+    # share the workers and hand each other these bounds as soon as they are proven
+    searches = {False: SizeSearch(max_size, lower_bound),
+                True: SizeSearch(max_size, lower_bound)}
+    pool = ProbePool(workers, timeout)
+    try:
+        while not all(search.is_done() for search in searches.values()):
+            started = True
+            while pool.has_capacity() and started:
+                started = False
+                for (complex_overlap_constraint, search) in searches.items():
+                    probed = [size for (c, size) in pool.running if c == complex_overlap_constraint]
+                    size = search.next_probe(probed)
+                    if size is not None and pool.has_capacity():
+                        pool.start(config_generator, size, complex_overlap_constraint,
+                                   model_options)
+                        started = True
+            if not pool.running:
+                break
+
+            for ((complex_overlap_constraint, size), result) in pool.wait():
+                print('({:%Y-%m-%d %H:%M:%S}) Size {} (complex: {}): {}'.format(
+                    datetime.datetime.now(), size, complex_overlap_constraint, result))
+                searches[complex_overlap_constraint].record(size, result)
+                if result == "sat" and not complex_overlap_constraint:
+                    searches[True].record(size, result)
+                elif result == "unsat" and complex_overlap_constraint:
+                    searches[False].record(size, result)
+            pool.cancel(lambda key: not searches[key[0]].is_relevant(key[1]))
+            for (complex_overlap_constraint, search) in searches.items():
+                print('({:%Y-%m-%d %H:%M:%S}) Current parameters (complex: {}):'.format(
+                    datetime.datetime.now(), complex_overlap_constraint),
+                    search.smallest_working_size, search.largest_failing_size)
+    finally:
+        pool.close()
+
+    min_non_complex = searches[False].result()
+    print("Min(non_complex)", min_non_complex)
+
+    min_complex = searches[True].result()
+    print("Min(complex)", min_complex)
+
+    print("Overhead(non_complex):", (min_non_complex - min_size) / min_size)
+    print("Overhead(complex):", (min_complex - min_size) / min_size)
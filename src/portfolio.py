@@ -0,0 +1,155 @@
+import datetime
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+
+import z3
+
+
+class Strategy(object):
+    def __init__(self, name, tactics=None, seed=0):
+        self.name = name
+        self.tactics = tactics
+        self.seed = seed
+
+    def __repr__(self):
+        return "Strategy({}, {}, {})".format(self.name, self.tactics, self.seed)
+
+    def solver(self):
+        z3.set_param("smt.random_seed", self.seed)
+        z3.set_param("sat.random_seed", self.seed)
+        if self.tactics is None:
+            return z3.Solver()
+        elif len(self.tactics) == 1:
+            return z3.Tactic(self.tactics[0]).solver()
+        return z3.Then(*self.tactics).solver()
+
+
+# Bit-blasting only applies to the quantifier free encoding, on quantified constraints these
+# strategies fail and simply never win the race
+DEFAULT_STRATEGIES = [
+    Strategy("default"),
+    Strategy("default/seed_1", seed=1),
+    Strategy("default/seed_2", seed=2),
+    Strategy("qfbv", ["qfbv"]),
+    Strategy("bit_blast", ["simplify", "solve-eqs", "bit-blast", "sat"]),
+    Strategy("smt_core", ["simplify", "propagate-values", "smt"]),
+]
+
+
+def model_values(m):
+    # The values of the constants of a model, in a form that survives the pipe
+    values = []
+    for d in m.decls():
+        if d.arity() != 0:
+            continue
+        value = m[d]
+        if z3.is_true(value) or z3.is_false(value):
+            values.append(("bool", d.name(), z3.is_true(value)))
+        elif z3.is_bv_value(value):
+            values.append(("bitvec", d.name(), value.size(), value.as_long()))
+        elif z3.is_int_value(value):
+            values.append(("int", d.name(), value.as_long()))
+    return values
+
+
+def pins(values):
+    terms = []
+    for value in values:
+        if value[0] == "bool":
+            terms.append(z3.Bool(value[1]) == value[2])
+        elif value[0] == "bitvec":
+            terms.append(z3.BitVec(value[1], value[2]) == value[3])
+        else:
+            terms.append(z3.Int(value[1]) == value[2])
+    return terms
+
+
+def run_strategy(strategy, constraints, timeout, connection):
+    values = None
+    try:
+        s = strategy.solver()
+        if timeout is not None:
+            s.set(timeout=int(timeout * 1000))
+        s.from_string(constraints)
+        result = str(s.check())
+        if result == "sat":
+            values = model_values(s.model())
+    except z3.Z3Exception:
+        result = "unknown"
+    connection.send((result, values))
+    connection.close()
+
+
+class Portfolio(object):
+    def __init__(self, strategies=None, workers=None, timeout=None, history=None):
+        self.strategies = DEFAULT_STRATEGIES if strategies is None else strategies
+        self.workers = len(self.strategies) if workers is None else workers
+        self.timeout = timeout
+        self.history = history
+        self.wins = {}
+        if history is not None and os.path.exists(history):
+            with open(history) as f:
+                self.wins = json.load(f)
+
+    def ranked_strategies(self):
+        # Strategies that won before go first, so they still race when there are fewer workers
+        # than strategies
+        return sorted(self.strategies, key=lambda strategy: -self.wins.get(strategy.name, 0))
+
+    def record_win(self, strategy):
+        self.wins[strategy.name] = self.wins.get(strategy.name, 0) + 1
+        if self.history is not None:
+            with open(self.history, "w") as f:
+                json.dump(self.wins, f, indent=4)
+
+    def check(self, s, *assumptions):
+        # Racing happens in separate processes on the serialised constraint set, the first
+        # definitive answer wins and every other strategy is killed. On sat, s itself is
+        # checked again with the winning model pinned, so callers can take a model from it
+        race = z3.Solver()
+        race.add(s.assertions())
+        race.add(*assumptions)
+        constraints = race.sexpr()
+
+        context = multiprocessing.get_context("spawn")
+        running = {}
+        for strategy in self.ranked_strategies()[:self.workers]:
+            (receiver, sender) = context.Pipe(duplex=False)
+            process = context.Process(target=run_strategy,
+                                      args=(strategy, constraints, self.timeout, sender))
+            process.start()
+            sender.close()
+            running[receiver] = (strategy, process)
+
+        result = z3.unknown
+        values = None
+        try:
+            while running and result == z3.unknown:
+                for receiver in multiprocessing.connection.wait(list(running)):
+                    (strategy, process) = running.pop(receiver)
+                    try:
+                        (answer, winning_values) = receiver.recv()
+                    except EOFError:
+                        (answer, winning_values) = ("unknown", None)
+                    process.join()
+                    receiver.close()
+                    if answer in ["sat", "unsat"] and result == z3.unknown:
+                        result = z3.sat if answer == "sat" else z3.unsat
+                        values = winning_values
+                        print('({:%Y-%m-%d %H:%M:%S}) Strategy {} won with {}'.format(
+                            datetime.datetime.now(), strategy.name, answer))
+                        self.record_win(strategy)
+        finally:
+            for (receiver, (strategy, process)) in running.items():
+                process.terminate()
+                process.join()
+                receiver.close()
+
+        if result == z3.sat:
+            # With every constant fixed this is quick. Should the pinned check not confirm
+            # the model, s is solved as it is
+            if values is None or not s.check(*(list(assumptions) + pins(values))) == z3.sat:
+                result = s.check(*assumptions)
+        return result
@@ -0,0 +1,73 @@
+from solver import address_span, is_pow_of_2, FixedArena, PartitionArena
+
+
+def subregion_granule(components):
+    # Subregion sizes are powers of two no smaller than this and aligned to their size, so
+    # every subregion boundary of every component is a multiple of it
+    granules = []
+    for c in components:
+        hw = c.hw_config
+        if not is_pow_of_2(hw.subregion_count):
+            return None
+        smallest_region = 1 << (max(hw.region_min_size, hw.subregion_count) - 1).bit_length()
+        granules.append(smallest_region // hw.subregion_count)
+    return min(granules) if granules else None
+
+
+def partition_lower_bound(components, arenas, partition_name="sram"):
+    # Arenas end below the end of their partition, so it needs a byte more than their sizes.
+    # Two arenas some component may access differently never share a granule: the subregion
+    # covering one would reach into the other. Each access set needs its own granules
+    partition_arenas = [a for a in arenas
+                        if isinstance(a, PartitionArena) and a.partition.name == partition_name]
+    if not partition_arenas:
+        return None
+    partition = partition_arenas[0].partition
+    bound = sum(a.size for a in partition_arenas) + 1
+
+    granule = subregion_granule(components)
+    if granule is not None and isinstance(partition.start, int):
+        sizes = {}
+        for a in partition_arenas:
+            key = (frozenset(a.readers), frozenset(a.writers))
+            sizes[key] = sizes.get(key, 0) + a.size
+        granules = sum(-(-size // granule) for size in sizes.values())
+        # The last usable address is two below the end
+        bound = max(bound, (partition.start // granule + granules - 1) * granule -
+                    partition.start + 2)
+    return bound
+
+
+def infeasibility_reasons(components, arenas):
+    # Necessary conditions only: an empty list does not mean the configuration is feasible
+    reasons = []
+    for a in arenas:
+        if a.size <= 0:
+            reasons.append("Arena {} is empty".format(a.name))
+
+    partitions = {}
+    for a in arenas:
+        if isinstance(a, PartitionArena):
+            partitions[a.partition.name] = a.partition
+    for p in partitions.values():
+        if not isinstance(p.start, int) or not isinstance(p.end, int):
+            continue
+        bound = partition_lower_bound(components, arenas, p.name)
+        if p.end - p.start < bound:
+            reasons.append("Partition {} has {} bytes, its arenas need at least {}".format(
+                p.name, p.end - p.start, bound))
+
+    fixed = sorted([a for a in arenas if isinstance(a, FixedArena)], key=address_span)
+    for (a1, a2) in zip(fixed, fixed[1:]):
+        if address_span(a2)[0] < address_span(a1)[1]:
+            reasons.append("Fixed arenas {} and {} overlap".format(a1.name, a2.name))
+
+    # Regions have a single set of permissions, every way a component accesses arenas needs
+    # a region of its own
+    for c in components:
+        classes = set((c in a.readers, c in a.writers) for a in arenas
+                      if c in a.readers or c in a.writers)
+        if len(classes) > c.hw_config.region_count:
+            reasons.append("Component {} accesses arenas in {} ways with {} regions".format(
+                c.name, len(classes), c.hw_config.region_count))
+    return reasons
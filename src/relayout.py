@@ -0,0 +1,107 @@
+#!/usr/local/bin/python3
+import argparse
+import datetime
+import json
+
+import z3
+from z3 import And, sat
+
+from solver import extract_layout, model, FixedArena
+
+
+def layout_delta(layout, components, arenas):
+    # Names of what the configuration added to and removed from the solved layout
+    old_components = set(c["name"] for c in layout["components"])
+    old_arenas = set(a["name"] for a in layout["arenas"])
+    new_components = set(c.name for c in components)
+    new_arenas = set(a.name for a in arenas)
+    return {"added_components": sorted(new_components - old_components),
+            "removed_components": sorted(old_components - new_components),
+            "added_arenas": sorted(new_arenas - old_arenas),
+            "removed_arenas": sorted(old_arenas - new_arenas)}
+
+
+def arena_pins(layout, arenas):
+    placed = dict((a["name"], a["start"]) for a in layout["arenas"])
+    return [a.start == a.address_space.offset(placed[a.name]) for a in arenas
+            if a.name in placed and not isinstance(a, FixedArena)]
+
+
+def region_pins(layout, components):
+    # Regions a component used keep their values, the ones it left unused stay free so it can
+    # reach arenas it now shares with added components
+    used = dict((c["name"], c["regions"]) for c in layout["components"])
+    pins = []
+    for c in components:
+        space = c.hw_config.address_space
+        for (r, region) in zip(c.regions, used.get(c.name, [])):
+            values = r.assignment(space.offset(region["start"]), region["size"])
+            values += [(r.readable, region["readable"]), (r.writeable, region["writeable"])]
+            subregions = region.get("subregions", [True] * len(r.subregions))
+            values += [(sr.enabled, enabled) for (sr, enabled) in zip(r.subregions, subregions)]
+            pins.append(And([term == value for (term, value) in values]))
+    return pins
+
+
+def moved_arenas(layout, new_layout):
+    old_starts = dict((a["name"], a["start"]) for a in layout["arenas"])
+    return sorted(a["name"] for a in new_layout["arenas"]
+                  if a["name"] in old_starts and a["start"] != old_starts[a["name"]])
+
+
+def relayout(layout, components, arenas, solve=None, **model_options):
+    # Lays out what the configuration added around what the solved layout already placed,
+    # first keeping the regions of the components as well and then only the arenas. Only when
+    # that fails is everything solved again, moving as few arenas as it can. Returns the
+    # result, the new layout and the arenas that moved
+    if solve is None:
+        def solve(s):
+            return s.check()
+
+    print('({:%Y-%m-%d %H:%M:%S}) Relayout:'.format(datetime.datetime.now()),
+          layout_delta(layout, components, arenas))
+    for (name, pins) in [("arenas and regions", arena_pins(layout, arenas) +
+                          region_pins(layout, components)),
+                         ("arenas", arena_pins(layout, arenas))]:
+        s = model(components, arenas, **model_options)
+        s.add(pins)
+        result = solve(s)
+        print('({:%Y-%m-%d %H:%M:%S}) Pinning {}: {}'.format(datetime.datetime.now(), name,
+                                                             result))
+        if result == sat:
+            return (sat, extract_layout(s.model(), components, arenas), [])
+
+    o = model(components, arenas, solver=z3.Optimize(), **model_options)
+    for pin in arena_pins(layout, arenas):
+        o.add_soft(pin)
+    result = o.check()
+    if not result == sat:
+        return (result, None, None)
+    new_layout = extract_layout(o.model(), components, arenas)
+    return (sat, new_layout, moved_arenas(layout, new_layout))
+
+
+if __name__ == '__main__':
+    from batch import build_config
+
+    z3.set_option(max_args=10000000, max_lines=1000000, max_depth=10000000, max_visited=1000000)
+
+    parser = argparse.ArgumentParser(description="Lay out a changed input spec around an "
+                                                 "earlier layout")
+    parser.add_argument("spec", help="JSON input spec of the changed configuration")
+    parser.add_argument("layout", help="JSON layout solved for the earlier configuration")
+    parser.add_argument("output", help="JSON file for the new layout")
+    parser.add_argument("--quantifier-free", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        (components, arenas) = build_config(json.load(f))
+    with open(args.layout) as f:
+        layout = json.load(f)
+    model_options = {"quantifier_free": True} if args.quantifier_free else {}
+    (result, new_layout, moved) = relayout(layout, components, arenas, **model_options)
+    print("Result:", result)
+    if new_layout is not None:
+        print("Moved arenas:", moved)
+        with open(args.output, "w") as f:
+            json.dump(new_layout, f, indent=4)
@@ -0,0 +1,117 @@
+#!/usr/local/bin/python3
+import argparse
+import json
+
+import z3
+
+from bench import bench_cell, parse_list, run_benchmarks
+from shrinker import min_ram_size
+from solver import SIZE_ENCODINGS
+from workload import workload_generator, TOPOLOGIES
+
+
+def scaling_cell_name(cell):
+    return "n_{}/{}/seed_{}/complex_{}/ram_{}".format(
+        cell["workload"]["components"], cell["workload"]["topology"], cell["workload"]["seed"],
+        cell["complex"], cell["ram_factor"])
+
+
+def scaling_cell(cell):
+    # A benchmark cell of a synthetic workload
+    config_generator = workload_generator(cell["workload"], cell["narrow"],
+                                          cell["size_encoding"])
+    return bench_cell(cell, config_generator, scaling_cell_name)
+
+
+def scaling_cells(counts, topologies, seeds, ram_factors, timeout, model_options, workload=None,
+                  narrow=False, size_encoding=None):
+    for topology in topologies:
+        for n in counts:
+            for seed in seeds:
+                description = dict(workload or {}, components=n, topology=topology, seed=seed)
+                min_size = min_ram_size(workload_generator(description))
+                for complex_overlap_constraint in [False, True]:
+                    for ram_factor in ram_factors:
+                        yield {"workload": description, "complex": complex_overlap_constraint,
+                               "ram_factor": ram_factor, "ram_size": int(min_size * ram_factor),
+                               "timeout": timeout, "model_options": model_options,
+                               "narrow": narrow, "size_encoding": size_encoding}
+
+
+def scaling_table(records):
+    # Mean build and solve time per topology, overlap constraint and component count. Cells
+    # that timed out count with the time they were given
+    table = {}
+    for record in records:
+        key = (record["workload"]["topology"], record["complex"],
+               record["workload"]["components"])
+        table.setdefault(key, []).append((record["build_time"], record["solve_time"],
+                                          record["result"]))
+    rows = []
+    for (key, times) in sorted(table.items()):
+        rows.append(key + (sum(b for (b, _, _) in times) / len(times),
+                           sum(s for (_, s, _) in times) / len(times),
+                           sum(1 for (_, _, r) in times if r == "unknown")))
+    return rows
+
+
+def plot_scaling(rows, path):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, not plotting", path)
+        return False
+
+    (fig, ax) = plt.subplots()
+    for (topology, complex_overlap_constraint) in sorted(set((r[0], r[1]) for r in rows)):
+        points = [(r[2], r[3] + r[4]) for r in rows
+                  if (r[0], r[1]) == (topology, complex_overlap_constraint)]
+        ax.plot([n for (n, _) in points], [t for (_, t) in points], marker="o",
+                label="{}{}".format(topology, " (complex)" if complex_overlap_constraint else ""))
+    ax.set_xlabel("Components")
+    ax.set_ylabel("Build and solve time (s)")
+    ax.set_yscale("log")
+    ax.legend()
+    fig.savefig(path)
+    return True
+
+
+if __name__ == '__main__':
+    z3.set_option(max_args=10000000, max_lines=1000000, max_depth=10000000, max_visited=1000000)
+
+    parser = argparse.ArgumentParser(description="Measure how solving scales with the number "
+                                                 "of components of a synthetic workload")
+    parser.add_argument("--components", type=parse_list, default=[2, 4, 6, 8, 10, 12])
+    parser.add_argument("--topologies", type=lambda v: v.split(","), default=TOPOLOGIES)
+    parser.add_argument("--seeds", type=parse_list, default=[0])
+    parser.add_argument("--ram-factors", type=lambda v: parse_list(v, float), default=[1.15])
+    parser.add_argument("--workload", default=None, help="JSON workload description to vary")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds per cell")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--quantifier-free", action="store_true")
+    parser.add_argument("--narrow", action="store_true", help="narrowed address spaces")
+    parser.add_argument("--size-encoding", default=None, choices=SIZE_ENCODINGS)
+    parser.add_argument("--output", default="scaling_results.json")
+    parser.add_argument("--plot", default="scaling.png")
+    args = parser.parse_args()
+
+    workload = None
+    if args.workload is not None:
+        with open(args.workload) as f:
+            workload = json.load(f)
+    model_options = {"quantifier_free": True} if args.quantifier_free else {}
+    cells = scaling_cells(args.components, args.topologies, args.seeds, args.ram_factors,
+                          args.timeout, model_options, workload, args.narrow,
+                          args.size_encoding)
+    records = run_benchmarks(cells, args.workers, scaling_cell)
+    with open(args.output, "w") as f:
+        json.dump(records, f, indent=4)
+
+    rows = scaling_table(records)
+    print("Topology Complex Components Build(s) Solve(s) Timeouts")
+    for row in rows:
+        print("{} {} {} {:.1f} {:.1f} {}".format(*row))
+    if plot_scaling(rows, args.plot):
+        print("Plot written to", args.plot)
@@ -1,21 +1,31 @@
 import datetime
+import json
+import time
 
-from solver import model, PartitionArena
+from decompose import check_decomposed
+from heuristic import greedy_layout, heuristic_size, layout_size, warm_start
+from precheck import infeasibility_reasons, partition_lower_bound
+from solver import extract_layout, model, PartitionArena
+from twostage import check_two_stage
+from verify import check_layout
 
-from z3 import sat, unsat
+import z3
+from z3 import Bool, BitVec, Implies, ULE, sat, unsat
 
 
-def test_shrinking(config_generator, max_size, min_size, complex_overlap_constraint):
-    print('({:%Y-%m-%d %H:%M:%S}) Starting shrinking test!'.format(datetime.datetime.now()))
-    (components, arenas) = config_generator(max_size, complex_overlap_constraint)
+def bisect_sizes(check_size, max_size, min_size, tighten=None):
+    # tighten, if given, maps a size just found to work to the smallest size known to work
+    # from what the check found there
+    if tighten is None:
+        def tighten(size):
+            return size
 
-    s = model(components, arenas)
-    result = s.check()
+    result = check_size(max_size)
     if not result == sat:
         raise ValueError("Largest size not large enough! (Result was {})".format(result))
     print("Passed initial check!")
 
-    smallest_working_size = max_size
+    smallest_working_size = tighten(max_size)
     largest_failing_size = min_size - 1
 
     while (smallest_working_size - largest_failing_size) > 1:
@@ -23,12 +33,10 @@ def test_shrinking(config_generator, max_size, min_size, complex_overlap_constra
               smallest_working_size, largest_failing_size)
 
         size_to_check = (smallest_working_size + largest_failing_size) // 2
-        (components, arenas) = config_generator(size_to_check, complex_overlap_constraint)
-        s = model(components, arenas)
-        result = s.check()
+        result = check_size(size_to_check)
         print(result)
         if result == sat:
-            smallest_working_size = size_to_check
+            smallest_working_size = tighten(size_to_check)
         elif result == unsat:
             largest_failing_size = size_to_check
         else:
@@ -36,20 +44,287 @@ def test_shrinking(config_generator, max_size, min_size, complex_overlap_constra
     return smallest_working_size
 
 
-def check_fragmentation(config_generator):
+def is_obviously_infeasible(components, arenas):
+    reasons = infeasibility_reasons(components, arenas)
+    for reason in reasons:
+        print("Infeasible without solving:", reason)
+    return len(reasons) > 0
+
+
+def fitted_size(config_generator, complex_overlap_constraint, layout, size):
+    # The arenas of a working layout often end well below the size it was found for, the
+    # layout then works for every size above their end
+    if layout is None:
+        return size
+    fitted = layout_size(layout, config_generator(size, complex_overlap_constraint)[1])
+    if fitted >= size:
+        return size
+    (components, arenas) = config_generator(fitted, complex_overlap_constraint)
+    if check_layout(layout, components, arenas):
+        return size
+    print("Layout found for size {} fits in {}".format(size, fitted))
+    return fitted
+
+
+def test_shrinking(config_generator, max_size, min_size, complex_overlap_constraint,
+                   portfolio=None, decomposed=False, two_stage=False, hint=False, cache=None,
+                   instrumentation=None, **model_options):
+    print('({:%Y-%m-%d %H:%M:%S}) Starting shrinking test!'.format(datetime.datetime.now()))
+
+    def solve(s):
+        if portfolio is not None:
+            return portfolio.check(s)
+        return s.check()
+
+    # The layout of the last size that worked seeds the probes after it
+    layout = None
+    # Subproblems that do not change with the size, such as flash, are only solved once
+    subproblem_results = {}
+
+    def check_size(size):
+        nonlocal layout
+        (components, arenas) = config_generator(size, complex_overlap_constraint)
+        if is_obviously_infeasible(components, arenas):
+            return unsat
+        if cache is not None:
+            result = cache.lookup(components, arenas, **model_options)
+            if result is not None:
+                if result == sat:
+                    layout = cache.layout(components, arenas, **model_options) or layout
+                return result
+
+        s = None
+        if decomposed:
+            result = check_decomposed(components, arenas, solve, subproblem_results,
+                                      **model_options)
+        elif two_stage:
+            (result, s) = check_two_stage(components, arenas, solve, **model_options)
+        else:
+            context = {"size": size, "complex_overlap_constraint": complex_overlap_constraint}
+            if instrumentation is not None:
+                s = instrumentation.model(components, arenas, context, **model_options)
+            else:
+                s = model(components, arenas, **model_options)
+            seed = layout
+            if seed is None and hint:
+                seed = greedy_layout(components, arenas)
+            if seed is not None:
+                warm_start(s, seed, components, arenas)
+            if instrumentation is not None:
+                result = instrumentation.check(s, solve, **context)
+            else:
+                result = solve(s)
+
+        if result == sat and s is not None:
+            try:
+                layout = extract_layout(s.model(), components, arenas)
+            except z3.Z3Exception:
+                pass
+        if cache is not None:
+            cache.store(components, arenas, result, s, **model_options)
+        return result
+
+    def tighten(size):
+        return fitted_size(config_generator, complex_overlap_constraint, layout, size)
+
+    return bisect_sizes(check_size, max_size, min_size, tighten)
+
+
+def test_shrinking_incremental(config_generator, max_size, min_size, complex_overlap_constraint,
+                               portfolio=None, **model_options):
+    print('({:%Y-%m-%d %H:%M:%S}) Starting incremental shrinking test!'.format(
+        datetime.datetime.now()))
+
+    # The model is built once with the RAM size left symbolic, every probe then only
+    # differs in the assumption pinning it, so lemmas learned so far stay valid
+    ram_size = BitVec("ram_size", 32)
+    (components, arenas) = config_generator(ram_size, complex_overlap_constraint)
+    s = model(components, arenas, **model_options)
+
+    def check_size(size):
+        assumption = Bool("ram_size=" + str(size))
+        s.add(Implies(assumption, ram_size == size))
+        if portfolio is not None:
+            return portfolio.check(s, assumption)
+        return s.check(assumption)
+
+    return bisect_sizes(check_size, max_size, min_size)
+
+
+def test_shrinking_optimise(config_generator, max_size, min_size, complex_overlap_constraint,
+                            **model_options):
+    print('({:%Y-%m-%d %H:%M:%S}) Starting optimising shrinking test!'.format(
+        datetime.datetime.now()))
+
+    # Arenas have to end below the end of their partition, so the smallest feasible RAM size
+    # is exactly the one the bisection converges to
+    ram_size = BitVec("ram_size", 32)
+    (components, arenas) = config_generator(ram_size, complex_overlap_constraint)
+    o = model(components, arenas, solver=z3.Optimize(), **model_options)
+    o.add(ULE(min_size, ram_size), ULE(ram_size, max_size))
+    o.minimize(ram_size)
+
+    result = o.check()
+    if not result == sat:
+        raise ValueError("Largest size not large enough! (Result was {})".format(result))
+    m = o.model()
+    print("Layout:", json.dumps(extract_layout(m, components, arenas), indent=4))
+    return m.eval(ram_size).as_long()
+
+
+class ShrinkResult(object):
+    def __init__(self, largest_failing_size, smallest_working_size, layout, complete):
+        self.largest_failing_size = largest_failing_size
+        self.smallest_working_size = smallest_working_size
+        self.layout = layout
+        self.complete = complete
+
+    def __repr__(self):
+        return "ShrinkResult({}, {}, {})".format(self.largest_failing_size,
+                                                 self.smallest_working_size, self.complete)
+
+
+def next_anytime_probe(largest_failing_size, smallest_working_size, undecided):
+    # Split the widest stretch between the proven bounds and the sizes that timed out, the
+    # upper one on ties as more memory tends to be quicker to prove feasible
+    bounds = sorted(set([largest_failing_size, smallest_working_size] + [
+        size for size in undecided if largest_failing_size < size < smallest_working_size]))
+    (low, high) = max(zip(bounds, bounds[1:]), key=lambda gap: (gap[1] - gap[0], gap[0]))
+    if high - low <= 1:
+        return None
+    return (low + high) // 2
+
+
+def test_shrinking_anytime(config_generator, max_size, min_size, complex_overlap_constraint,
+                           check_timeout=None, budget=None, quantifier_free=False,
+                           **model_options):
+    print('({:%Y-%m-%d %H:%M:%S}) Starting anytime shrinking test!'.format(
+        datetime.datetime.now()))
+
+    # A probe that times out is retried once with the other encoding, after that the search
+    # moves on to the next best size and the interval proven so far is kept either way
+    deadline = None if budget is None else time.time() + budget
+    largest_failing_size = min_size - 1
+    smallest_working_size = None
+    layout = None
+    undecided = set()
+
+    # The greedy layout is the first working size, should the solver not get any further
+    size = max_size
+    seed = heuristic_size(config_generator, complex_overlap_constraint)
+    if seed is not None and seed[0] <= max_size:
+        (smallest_working_size, layout) = seed
+        size = next_anytime_probe(largest_failing_size, smallest_working_size, undecided)
+    while size is not None:
+        result = z3.unknown
+        for encoding in [quantifier_free, not quantifier_free]:
+            timeout = check_timeout
+            if deadline is not None:
+                left = deadline - time.time()
+                timeout = left if timeout is None else min(timeout, left)
+            if timeout is not None and timeout <= 0:
+                break
+            (components, arenas) = config_generator(size, complex_overlap_constraint)
+            if is_obviously_infeasible(components, arenas):
+                result = unsat
+                break
+            s = model(components, arenas, encoding, **model_options)
+            if timeout is not None:
+                s.set(timeout=int(timeout * 1000))
+            result = s.check()
+            print('({:%Y-%m-%d %H:%M:%S}) Size {} (quantifier free: {}): {}'.format(
+                datetime.datetime.now(), size, encoding, result))
+            if not result == z3.unknown:
+                break
+
+        if result == sat:
+            layout = extract_layout(s.model(), components, arenas)
+            smallest_working_size = fitted_size(config_generator, complex_overlap_constraint,
+                                                layout, size)
+        elif result == unsat:
+            largest_failing_size = size
+        else:
+            undecided.add(size)
+
+        # Without a working size there is nothing to shrink from
+        if smallest_working_size is None:
+            break
+        if deadline is not None and time.time() >= deadline:
+            break
+        size = next_anytime_probe(largest_failing_size, smallest_working_size, undecided)
+
+    complete = smallest_working_size is not None and \
+        smallest_working_size - largest_failing_size == 1
+    return ShrinkResult(largest_failing_size, smallest_working_size, layout, complete)
+
+
+def min_ram_size(config_generator):
     (components, arenas) = config_generator(0, False)
-    min_size = sum(a.size
-                   for a in arenas if isinstance(a, PartitionArena) and a.partition.name == "sram")
+    return sum(a.size
+               for a in arenas if isinstance(a, PartitionArena) and a.partition.name == "sram")
+
+
+def size_bounds(config_generator):
+    # The search starts from the lower bound, the overhead is still reported against the sum
+    # of the arena sizes
+    min_size = min_ram_size(config_generator)
     max_size = int(min_size * 1.5)
+    lower_bound = partition_lower_bound(*config_generator(0, False)) or min_size
+
+    # A layout the greedy packing found and the layout checker accepted is a proven upper
+    # bound for both overlap constraints, as the complex one is a relaxation of the non
+    # complex one
+    seed = heuristic_size(config_generator, False)
+    if seed is not None and seed[0] < max_size:
+        print("Heuristic size", seed[0])
+        max_size = seed[0]
+    return (min_size, lower_bound, max_size)
+
+
+def check_fragmentation(config_generator, shrink=test_shrinking, **model_options):
+    (min_size, lower_bound, max_size) = size_bounds(config_generator)
 
-    print("Min size", min_size, "Max size", max_size)
+    print("Min size", min_size, "Lower bound", lower_bound, "Max size", max_size)
 
     # Do shrinking for non complex case
-    min_non_complex = test_shrinking(config_generator, max_size, min_size, False)
+    min_non_complex = shrink(config_generator, max_size, lower_bound, False, **model_options)
     print("Min(non_complex)", min_non_complex)
 
-    min_complex = test_shrinking(config_generator, min_non_complex,  min_size, True)
+    min_complex = shrink(config_generator, min_non_complex, lower_bound, True, **model_options)
     print("Min(complex)", min_complex)
 
     print("Overhead(non_complex):", (min_non_complex - min_size) / min_size)
     print("Overhead(complex):", (min_complex - min_size) / min_size)
+
+
+def check_fragmentation_anytime(config_generator, check_timeout=None, budget=None,
+                                **model_options):
+    (min_size, lower_bound, max_size) = size_bounds(config_generator)
+
+    print("Min size", min_size, "Lower bound", lower_bound, "Max size", max_size)
+
+    # Both searches share the global budget, what the first leaves over goes to the second
+    deadline = None if budget is None else time.time() + budget
+    non_complex = test_shrinking_anytime(config_generator, max_size, lower_bound, False,
+                                         check_timeout, budget, **model_options)
+    print("Interval(non_complex)", non_complex.largest_failing_size,
+          non_complex.smallest_working_size, "complete" if non_complex.complete else "partial")
+
+    remaining = None if deadline is None else max(0, deadline - time.time())
+    complex_max_size = non_complex.smallest_working_size or max_size
+    with_complex = test_shrinking_anytime(config_generator, complex_max_size, lower_bound, True,
+                                          check_timeout, remaining, **model_options)
+    if with_complex.smallest_working_size is None:
+        # The complex overlap constraint is a relaxation, the non complex layout works for it
+        with_complex.smallest_working_size = non_complex.smallest_working_size
+        with_complex.layout = non_complex.layout
+    print("Interval(complex)", with_complex.largest_failing_size,
+          with_complex.smallest_working_size, "complete" if with_complex.complete else "partial")
+
+    for (name, result) in [("non_complex", non_complex), ("complex", with_complex)]:
+        if result.smallest_working_size is not None:
+            print("Overhead({}): at most".format(name),
+                  (result.smallest_working_size - min_size) / min_size)
+        if result.layout is not None:
+            print("Layout({}):".format(name), json.dumps(result.layout, indent=4))
+    return (non_complex, with_complex)
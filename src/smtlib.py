@@ -0,0 +1,81 @@
+import datetime
+import os
+import subprocess
+import tempfile
+
+import z3
+from z3 import BitVec, sat, unsat
+
+from cache import config_key
+from shrinker import bisect_sizes, is_obviously_infeasible
+from solver import model
+
+RAM_SIZE = "ram_size"
+
+
+class SmtLibCache(object):
+    # Models compiled once with the RAM size left as a declared constant, every probe then
+    # only pins it and hands the file to a z3 process of its own, without building anything
+    def __init__(self, directory=None, binary="z3"):
+        if directory is None:
+            directory = os.path.join(
+                os.environ.get("MPU_AUTOCONFIG_CACHE", ".mpu_autoconfig_cache"), "smt2")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.binary = binary
+
+    def compile(self, config_generator, complex_overlap_constraint, **model_options):
+        ram_size = BitVec(RAM_SIZE, 32)
+        (components, arenas) = config_generator(ram_size, complex_overlap_constraint)
+        (key, _) = config_key(components, arenas, **model_options)
+        path = os.path.join(self.directory, key + ".smt2")
+        if os.path.exists(path):
+            return path
+
+        print('({:%Y-%m-%d %H:%M:%S}) Compiling {}'.format(datetime.datetime.now(), path))
+        s = model(components, arenas, **model_options)
+        # Written next to its final name and moved there, so workers never read half a file
+        (fd, partial) = tempfile.mkstemp(dir=self.directory, suffix=".partial")
+        with os.fdopen(fd, "w") as f:
+            f.write(s.sexpr())
+        os.replace(partial, path)
+        return path
+
+    def check(self, path, size, timeout=None):
+        command = [self.binary, "-in", "-smt2"]
+        if timeout is not None:
+            command.append("-t:{}".format(int(timeout * 1000)))
+        with open(path) as f:
+            problem = f.read()
+        probe = "(assert (= {} (_ bv{} 32)))\n(check-sat)\n".format(RAM_SIZE, size)
+        output = subprocess.run(command, input=problem + probe, capture_output=True,
+                                text=True).stdout.split()
+        if output and output[-1] == "sat":
+            return sat
+        elif output and output[-1] == "unsat":
+            return unsat
+        return z3.unknown
+
+
+def test_shrinking_smtlib(config_generator, max_size, min_size, complex_overlap_constraint,
+                          smtlib=None, cache=None, timeout=None, **model_options):
+    print('({:%Y-%m-%d %H:%M:%S}) Starting SMT-LIB shrinking test!'.format(
+        datetime.datetime.now()))
+    smtlib = SmtLibCache() if smtlib is None else smtlib
+    path = smtlib.compile(config_generator, complex_overlap_constraint, **model_options)
+
+    def check_size(size):
+        # The configuration itself is cheap to build, it is the constraints that are not
+        (components, arenas) = config_generator(size, complex_overlap_constraint)
+        if is_obviously_infeasible(components, arenas):
+            return unsat
+        if cache is not None:
+            result = cache.lookup(components, arenas, **model_options)
+            if result is not None:
+                return result
+        result = smtlib.check(path, size, timeout)
+        if cache is not None:
+            cache.store(components, arenas, result, **model_options)
+        return result
+
+    return bisect_sizes(check_size, max_size, min_size)
@@ -3,13 +3,56 @@
 from abc import ABC
 
 import z3
-from z3 import And, Bool, BitVec, Exists, ForAll, If, Implies, Not, Or, UGE, ULE
+from z3 import Bool, BitVec, BitVecVal, Exists, ForAll, If, LShR, UGE, ZeroExt
+
+
+def connective(make, predicates):
+    # z3.And and z3.Or check the sort of every argument against the others, which made them
+    # most of the time spent building the model. Arguments here are always Boolean
+    if len(predicates) == 1 and isinstance(predicates[0], (list, tuple)):
+        predicates = predicates[0]
+    ctx = z3.main_ctx()
+    terms = (z3.Ast * len(predicates))()
+    for (i, p) in enumerate(predicates):
+        terms[i] = (z3.BoolVal(p, ctx) if isinstance(p, bool) else p).as_ast()
+    return z3.BoolRef(make(ctx.ref(), len(predicates), terms), ctx)
+
+
+def And(*predicates):
+    return connective(z3.Z3_mk_and, predicates)
+
+
+def Or(*predicates):
+    return connective(z3.Z3_mk_or, predicates)
+
+
+def Implies(a, b):
+    return connective(lambda ctx, n, terms: z3.Z3_mk_implies(ctx, terms[0], terms[1]), (a, b))
+
+
+def Not(a):
+    return connective(lambda ctx, n, terms: z3.Z3_mk_not(ctx, terms[0]), (a,))
+
+
+def comparison(make, a, b):
+    # Same shortcut for unsigned comparisons, whose sort checks cost as much again
+    if isinstance(a, int):
+        a = BitVecVal(a, b.size())
+    elif isinstance(b, int):
+        b = BitVecVal(b, a.size())
+    return z3.BoolRef(make(a.ctx_ref(), a.as_ast(), b.as_ast()), a.ctx)
 
 
 def ULT(a, b):
     if isinstance(a, int) and isinstance(b, int):
         return a < b
-    return z3.ULT(a, b)
+    return comparison(z3.Z3_mk_bvult, a, b)
+
+
+def ULE(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return a <= b
+    return comparison(z3.Z3_mk_bvule, a, b)
 
 
 def is_pow_of_2(x):
@@ -20,6 +63,10 @@ def overlap(r1, r2):
     return And(ULT(r1.start, r2.end), ULT(r2.start, r1.end))
 
 
+def nonempty_overlap(r1, r2):
+    return And(ULT(r1.start, r1.end), ULT(r2.start, r2.end), overlap(r1, r2))
+
+
 def any_overlap(ranges):
     predicates = []
     already_checked = []
@@ -30,6 +77,18 @@ def any_overlap(ranges):
     return Or(predicates)
 
 
+def memoised(cache, addr, build):
+    # z3 terms compare into expressions, so they are keyed on their AST id. The term is kept
+    # with the entry so its id cannot be handed to another term while the entry lives. Fixed
+    # arenas ask about plain integers, which have no id and are cheap to ask about anyway
+    if isinstance(addr, int):
+        return build()
+    key = addr.get_id()
+    if key not in cache:
+        cache[key] = (addr, build())
+    return cache[key][1]
+
+
 def at_most_one(predicates):
     as_ints = []
     for p in predicates:
@@ -37,38 +96,130 @@ def at_most_one(predicates):
     return sum(as_ints) <= 1
 
 
+class AddressSpace(object):
+    # Addresses are encoded as offsets from base in bit-vectors of the given width. Narrow
+    # spaces leave two bits of headroom: regions are capped at a quarter of the space, so their
+    # ends never wrap and their sizes never turn negative in the signed division and modulo
+    def __init__(self, base=0, bits=32):
+        self.base = base
+        self.bits = bits
+        self.max_region_size = None if bits == 32 else 2 ** (bits - 2)
+        if self.max_region_size is not None and base % self.max_region_size != 0:
+            raise ValueError("Base {} is not aligned to the largest region size".format(base))
+
+    def __repr__(self):
+        return "AddressSpace({}, {})".format(self.base, self.bits)
+
+    def __eq__(self, other):
+        return isinstance(other, AddressSpace) and \
+            (self.base, self.bits) == (other.base, other.bits)
+
+    def __hash__(self):
+        return hash((self.base, self.bits))
+
+    def bitvec(self, name):
+        return BitVec(name, self.bits)
+
+    def contains(self, address):
+        return 0 <= address - self.base < 2 ** self.bits
+
+    def offset(self, address):
+        if not isinstance(address, int):
+            if self.base != 0 or self.bits != address.size():
+                raise ValueError("Symbolic addresses need the full address space")
+            return address
+        if not self.contains(address):
+            raise ValueError("Address {} is outside of {}".format(address, self))
+        return address - self.base
+
+    def absolute(self, offset):
+        return offset + self.base
+
+
+def narrow_address_space(spans, region_min_size=256):
+    # The smallest naturally aligned window holding every span, at least as large as the
+    # smallest region. Larger regions would contain the whole window and can always be
+    # replaced by one covering exactly the window
+    start = min(s for (s, e) in spans)
+    end = max(e for (s, e) in spans)
+    bits = 0
+    while (start >> bits) != ((end - 1) >> bits) or 2 ** bits < region_min_size:
+        bits += 1
+    if bits + 2 >= 32:
+        return AddressSpace()
+    return AddressSpace((start >> bits) << bits, bits + 2)
+
+
+SIZE_ENCODINGS = ["bitvector", "exponent"]
+
+
 class HardwareConfig(object):
+    # Region sizes are either free bit-vectors constrained to powers of two, or exponents
+    # with starts built by shifting a base index, which leaves no division or modulo
     def __init__(self, region_min_size=256, region_count=8, subregion_count=8,
-                 complex_overlap_constraint=False):
+                 complex_overlap_constraint=False, address_space=None,
+                 size_encoding="bitvector"):
+        if size_encoding not in SIZE_ENCODINGS:
+            raise ValueError("Unknown size encoding {}".format(size_encoding))
+        if size_encoding == "exponent" and not is_pow_of_2(subregion_count):
+            raise ValueError("The exponent encoding needs a power of two subregion count")
         self.region_min_size = region_min_size
         self.region_count = region_count
         self.subregion_count = subregion_count
         self.complex_overlap_constraint = complex_overlap_constraint
+        self.address_space = AddressSpace() if address_space is None else address_space
+        self.size_encoding = size_encoding
+
+    def exponent_range(self):
+        # Sizes are at least the minimum and split evenly into subregions. The full space
+        # stops at 2^31, as 2^32 does not fit its bit-vectors
+        largest = self.address_space.max_region_size or 2 ** (self.address_space.bits - 1)
+        smallest = max(self.region_min_size, self.subregion_count, 1)
+        return ((smallest - 1).bit_length(), largest.bit_length() - 1)
 
 
 class Component(object):
+    # Every arena asks every component whether it can access the same few addresses, so the
+    # answers are built once per address term
     def __init__(self, name, hw_config):
         self.name = name
         self.hw_config = hw_config
         self.regions = []
         for i in range(hw_config.region_count):
             self.regions.append(Region(self, i, hw_config))
+        self.read_cache = {}
+        self.write_cache = {}
 
     def __repr__(self):
         return "Component({}, {})".format(self.name, self.hw_config)
 
     def only_single_enabled_region(self):
-        addr = BitVec("addr", 32)
+        addr = self.hw_config.address_space.bitvec("addr")
         region_predicates = []
         for r in self.regions:
             region_predicates.append(r.is_enabled(addr))
         return ForAll(addr, at_most_one(region_predicates))
 
-    def is_consistent(self):
+    def only_single_enabled_region_qf(self):
+        # Subregions of one region never overlap, so it is enough to check that no enabled
+        # subregions of two different regions intersect
+        disjoint = []
+        for (i, r1) in enumerate(self.regions):
+            for r2 in self.regions[i + 1:]:
+                for sr1 in r1.subregions:
+                    for sr2 in r2.subregions:
+                        disjoint.append(Not(And(sr1.enabled, sr2.enabled,
+                                                nonempty_overlap(sr1, sr2))))
+        return And(disjoint)
+
+    def is_consistent(self, quantifier_free=False):
         # Regions cannot overlap
         self_consistency = []
         if self.hw_config.complex_overlap_constraint:
-            self_consistency.append(self.only_single_enabled_region())
+            if quantifier_free:
+                self_consistency.append(self.only_single_enabled_region_qf())
+            else:
+                self_consistency.append(self.only_single_enabled_region())
         else:
             self_consistency.append(Not(any_overlap(self.regions)))
 
@@ -78,47 +229,92 @@ class Component(object):
         return self_consistency + region_consistency
 
     def can_read(self, addr):
-        region_readiblity = []
-        for r in self.regions:
-            region_readiblity.append(r.can_read(addr))
-        return Or(region_readiblity)
+        return memoised(self.read_cache, addr,
+                        lambda: Or([r.can_read(addr) for r in self.regions]))
 
     def can_write(self, addr):
-        region_writeablity = []
-        for r in self.regions:
-            region_writeablity.append(r.can_write(addr))
-        return Or(region_writeablity)
+        return memoised(self.write_cache, addr,
+                        lambda: Or([r.can_write(addr) for r in self.regions]))
+
+    def readable_subregions(self):
+        return [(r.readable, sr) for r in self.regions for sr in r.subregions]
+
+    def writeable_subregions(self):
+        return [(r.writeable, sr) for r in self.regions for sr in r.subregions]
 
 
 class Region(object):
+    __slots__ = ["owner", "name", "hw_config", "start", "size", "end", "exponent", "index",
+                 "allocated", "subregion_size", "built_subregions", "readable", "writeable",
+                 "enabled_cache"]
+
     def __init__(self, owner, number, hw_config):
         self.owner = owner
-        self.name = self.owner.name + "/r_" + str(number)
+        self.name = owner.name + "/r_" + str(number)
         self.hw_config = hw_config
 
-        self.start = BitVec(self.name + "/start", 32)
-        self.size = BitVec(self.name + "/size", 32)
+        space = hw_config.address_space
+        if hw_config.size_encoding == "exponent":
+            bits = space.bits.bit_length()
+            self.exponent = BitVec(self.name + "/exponent", bits)
+            self.index = space.bitvec(self.name + "/index")
+            self.allocated = Bool(self.name + "/allocated")
+            shift = ZeroExt(space.bits - bits, self.exponent)
+            self.start = self.index << shift
+            self.size = If(self.allocated, BitVecVal(1, space.bits) << shift, 0)
+            self.subregion_size = LShR(self.size,
+                                       (hw_config.subregion_count - 1).bit_length())
+        else:
+            self.start = space.bitvec(self.name + "/start")
+            self.size = space.bitvec(self.name + "/size")
+            self.subregion_size = self.size / hw_config.subregion_count
         self.end = self.start + self.size
-        subregion_size = self.size / hw_config.subregion_count
-        self.subregions = []
-        for i in range(hw_config.subregion_count):
-            start = self.start + i * subregion_size
-            self.subregions.append(Subregion(self, i, start, start + subregion_size))
+        self.built_subregions = None
         self.readable = Bool(self.name + "/can_read")
         self.writeable = Bool(self.name + "/can_write")
+        self.enabled_cache = {}
+
+    @property
+    def subregions(self):
+        # Built on first use, the non complex overlap constraint never looks at them
+        if self.built_subregions is None:
+            self.built_subregions = []
+            for i in range(self.hw_config.subregion_count):
+                start = self.start + i * self.subregion_size
+                self.built_subregions.append(Subregion(self, i, start,
+                                                       start + self.subregion_size))
+        return self.built_subregions
 
     def is_consistent(self):
-        return [Or(self.size == 0, And(ULT(self.start, self.end),
-                                       is_pow_of_2(self.size),
-                                       self.size % self.hw_config.subregion_count == 0,
-                                       self.start % self.size == 0,
-                                       UGE(self.size, self.hw_config.region_min_size)))]
+        if self.hw_config.size_encoding == "exponent":
+            (smallest, largest) = self.hw_config.exponent_range()
+            return [Implies(self.allocated, And(ULE(smallest, self.exponent),
+                                                ULE(self.exponent, largest),
+                                                ULT(self.start, self.end)))]
+
+        consistency = [Or(self.size == 0, And(ULT(self.start, self.end),
+                                              is_pow_of_2(self.size),
+                                              self.size % self.hw_config.subregion_count == 0,
+                                              self.start % self.size == 0,
+                                              UGE(self.size, self.hw_config.region_min_size)))]
+        max_region_size = self.hw_config.address_space.max_region_size
+        if max_region_size is not None:
+            consistency.append(ULE(self.size, max_region_size))
+        return consistency
+
+    def assignment(self, start, size):
+        # Values for the variables behind a region of the given offset and size
+        if self.hw_config.size_encoding == "exponent":
+            if size == 0:
+                return [(self.allocated, False)]
+            exponent = size.bit_length() - 1
+            return [(self.allocated, True), (self.exponent, exponent),
+                    (self.index, start >> exponent)]
+        return [(self.start, start), (self.size, size)]
 
     def is_enabled(self, addr):
-        subregion_enabled = []
-        for sr in self.subregions:
-            subregion_enabled.append(sr.is_enabled(addr))
-        return Or(subregion_enabled)
+        return memoised(self.enabled_cache, addr,
+                        lambda: Or([sr.is_enabled(addr) for sr in self.subregions]))
 
     def can_read(self, addr):
         return And(self.readable, self.is_enabled(addr))
@@ -128,9 +324,11 @@ class Region(object):
 
 
 class Subregion(object):
+    __slots__ = ["owner", "name", "start", "end", "enabled"]
+
     def __init__(self, owner, number, start, end):
         self.owner = owner
-        self.name = self.owner.name + "/sr_" + str(number)
+        self.name = owner.name + "/sr_" + str(number)
         self.start = start
         self.end = end
         self.enabled = Bool(self.name + "/enabled")
@@ -140,19 +338,21 @@ class Subregion(object):
 
 
 class Partition(object):
-    def __init__(self, name, start, end):
+    def __init__(self, name, start, end, address_space=None):
         self.name = name
         self.start = start
         self.end = end
+        self.address_space = AddressSpace() if address_space is None else address_space
 
 
 class Arena(ABC):
-    def __init__(self, name, start, end, readers, writers):
+    def __init__(self, name, start, end, readers, writers, address_space):
         self.name = name
         self.start = start
         self.end = end
         self.readers = readers
         self.writers = writers
+        self.address_space = address_space
 
     def __repr__(self):
         return "Arena({}, {}, {})".format(self.name, self.start, self.end)
@@ -163,38 +363,62 @@ class Arena(ABC):
     def contains(self, addr):
         return And(ULE(self.start, addr), ULT(addr, self.end))
 
-    def access_consistent(self, all_components):
+    def access_consistent(self, all_components, quantifier_free=False):
         constraints = []
 
         for r in self.readers:
-            constraints.append(self.readable_by(r))
+            constraints.append(self.readable_by(r, quantifier_free))
 
         non_readers = list(filter(lambda c: c not in self.readers, all_components))
         for nr in non_readers:
-            constraints.append(self.not_readable_by(nr))
+            constraints.append(self.not_readable_by(nr, quantifier_free))
 
         for w in self.writers:
-            constraints.append(self.writeable_by(w))
+            constraints.append(self.writeable_by(w, quantifier_free))
 
         non_writers = list(filter(lambda c: c not in self.writers, all_components))
         for nw in non_writers:
-            constraints.append(self.not_writeable_by(nw))
+            constraints.append(self.not_writeable_by(nw, quantifier_free))
         return constraints
 
-    def readable_by(self, component):
-        addr = BitVec("addr", 32)
+    def covered_by(self, subregions, can_access):
+        # An interval is covered by a union of intervals iff its first address is covered and
+        # so is every end of an accessible subregion that falls inside it
+        constraints = [Implies(ULT(self.start, self.end), can_access(self.start))]
+        for (accessible, sr) in subregions:
+            ends_inside = And(accessible, sr.enabled,
+                              ULT(self.start, sr.end), ULT(sr.end, self.end))
+            constraints.append(Implies(ends_inside, can_access(sr.end)))
+        return And(constraints)
+
+    def disjoint_from(self, subregions):
+        disjoint = []
+        for (accessible, sr) in subregions:
+            disjoint.append(Not(And(accessible, sr.enabled, nonempty_overlap(self, sr))))
+        return And(disjoint)
+
+    def readable_by(self, component, quantifier_free=False):
+        if quantifier_free:
+            return self.covered_by(component.readable_subregions(), component.can_read)
+        addr = self.address_space.bitvec("addr")
         return ForAll(addr, Implies(self.contains(addr), component.can_read(addr)))
 
-    def not_readable_by(self, component):
-        addr = BitVec("addr", 32)
+    def not_readable_by(self, component, quantifier_free=False):
+        if quantifier_free:
+            return self.disjoint_from(component.readable_subregions())
+        addr = self.address_space.bitvec("addr")
         return Not(Exists(addr, And(self.contains(addr), component.can_read(addr))))
 
-    def writeable_by(self, component):
-        addr = BitVec("addr", 32)
+    def writeable_by(self, component, quantifier_free=False):
+        if quantifier_free:
+            return self.covered_by(component.writeable_subregions(), component.can_write)
+        addr = self.address_space.bitvec("addr")
         return ForAll(addr, Implies(self.contains(addr), component.can_write(addr)))
 
-    def not_writeable_by(self, component):
-        addr = BitVec("addr", 32)
+    def not_writeable_by(self, component, quantifier_free=False):
+        if quantifier_free:
+            return self.disjoint_from(component.writeable_subregions())
+        addr = self.address_space.bitvec("addr")
         return Not(Exists(addr, And(self.contains(addr), component.can_write(addr))))
 
 
@@ -202,31 +426,216 @@ class PartitionArena(Arena):
     def __init__(self, name, partition, size, readers, writers):
         self.partition = partition
         self.size = size
-        start = BitVec(name + "/start", 32)
-        super().__init__(name, start, start + size, readers, writers)
+        start = partition.address_space.bitvec(name + "/start")
+        super().__init__(name, start, start + size, readers, writers, partition.address_space)
 
     def is_consistent(self):
-        return super().is_consistent() + [ULE(self.partition.start, self.start),
-                                          ULT(self.end, self.partition.end)]
+        space = self.address_space
+        return super().is_consistent() + [ULE(space.offset(self.partition.start), self.start),
+                                          ULT(self.end, space.offset(self.partition.end))]
 
 
 class FixedArena(Arena):
-    def __init__(self, name, start, end, readers, writers):
+    def __init__(self, name, start, end, readers, writers, address_space=None):
         self.size = end - start
-        super().__init__(name, start, end, readers, writers)
+        space = AddressSpace() if address_space is None else address_space
+        super().__init__(name, space.offset(start), space.offset(end), readers, writers, space)
+
+
+def address_span(arena):
+    if isinstance(arena, PartitionArena):
+        return (arena.partition.start, arena.partition.end)
+    return (arena.address_space.absolute(arena.start), arena.address_space.absolute(arena.end))
+
+
+def may_overlap(a1, a2):
+    # Arenas confined to address spans that are known to be disjoint can never overlap
+    for ((start1, end1), (start2, end2)) in [(address_span(a1), address_span(a2)),
+                                             (address_span(a2), address_span(a1))]:
+        if isinstance(end1, int) and isinstance(start2, int) and end1 <= start2:
+            return False
+    return True
+
+
+def odd_even_merge_pairs(n):
+    # Batcher's odd-even merge sort, which also sorts when n is not a power of two
+    p = 1
+    while p < n:
+        k = p
+        while k >= 1:
+            for j in range(k % p, n - k, 2 * k):
+                for i in range(min(k, n - j - k)):
+                    if (i + j) // (p * 2) == (i + j + k) // (p * 2):
+                        yield (i + j, i + j + k)
+            k //= 2
+        p *= 2
+
+
+def sorted_by_start(arenas):
+    def bv(x, space):
+        return BitVecVal(x, space.bits) if isinstance(x, int) else x
+
+    bounds = [(bv(a.start, a.address_space), bv(a.end, a.address_space)) for a in arenas]
+    for (i, j) in odd_even_merge_pairs(len(bounds)):
+        ((start1, end1), (start2, end2)) = (bounds[i], bounds[j])
+        first = ULE(start1, start2)
+        bounds[i] = (If(first, start1, start2), If(first, end1, end2))
+        bounds[j] = (If(first, start2, start1), If(first, end2, end1))
+    return bounds
+
+
+def arenas_disjoint(arenas, overlap_encoding="pairwise"):
+    if overlap_encoding == "pairwise":
+        return Not(any_overlap(arenas))
+    elif overlap_encoding == "partition":
+        predicates = []
+        for (i, a1) in enumerate(arenas):
+            for a2 in arenas[:i]:
+                if may_overlap(a1, a2):
+                    predicates.append(overlap(a1, a2))
+        return Not(Or(predicates))
+    elif overlap_encoding == "sorted":
+        # Arenas are never empty, so they are disjoint iff every arena ends before the next one
+        # in the order of their starts
+        bounds = sorted_by_start(arenas)
+        return And([ULE(end, start) for ((_, end), (start, _)) in zip(bounds, bounds[1:])])
+    raise ValueError("Unknown overlap encoding {}".format(overlap_encoding))
+
+
+def regions_ordered(regions):
+    # Regions of a component are interchangeable: the used ones come first, ordered by start
+    # and then by size
+    ordered = []
+    for (r1, r2) in zip(regions, regions[1:]):
+        ordered.append(Implies(r2.size != 0, And(r1.size != 0, Or(
+            ULT(r1.start, r2.start), And(r1.start == r2.start, ULE(r1.size, r2.size))))))
+    return ordered
+
+
+def interchangeable_arenas(arenas):
+    # Arenas of a partition with the same size and the same readers and writers can swap
+    # places in any layout
+    groups = {}
+    for a in arenas:
+        if isinstance(a, PartitionArena) and isinstance(a.size, int):
+            key = (id(a.partition), a.size, frozenset(a.readers), frozenset(a.writers))
+            groups.setdefault(key, []).append(a)
+    return [group for group in groups.values() if len(group) > 1]
 
 
-def model(components, arenas):
-    s = z3.Solver()
+def arenas_ordered(arenas):
+    return [ULT(a1.start, a2.start)
+            for group in interchangeable_arenas(arenas) for (a1, a2) in zip(group, group[1:])]
 
-    for c in components:
-        s.add(*c.is_consistent())
 
-    for a in arenas:
-        s.add(a.is_consistent())
-        s.add(a.access_consistent(components))
+def symmetry_constraints(components, arenas):
+    # Every layout can be permuted into one that satisfies these, see equivalence.py
+    return [p for c in components for p in regions_ordered(c.regions)] + arenas_ordered(arenas)
+
+
+def constraint_families(components, arenas, quantifier_free=False, overlap_encoding="pairwise",
+                        symmetry_breaking=False):
+    # Each family is only built when asked for, so building it can be timed on its own
+    yield ("component_consistency",
+           lambda: [p for c in components for p in c.is_consistent(quantifier_free)])
+    yield ("arena_consistency", lambda: [p for a in arenas for p in a.is_consistent()])
+    yield ("arena_access",
+           lambda: [p for a in arenas for p in a.access_consistent(components, quantifier_free)])
 
     # Arenas can't overlap
-    s.add(Not(any_overlap(arenas)))
+    yield ("arena_overlap", lambda: [arenas_disjoint(arenas, overlap_encoding)])
+
+    if symmetry_breaking:
+        yield ("symmetry_breaking", lambda: symmetry_constraints(components, arenas))
+
 
+def address_spaces(components, arenas):
+    return set([c.hw_config.address_space for c in components] +
+               [a.address_space for a in arenas])
+
+
+def copy_config(components, arenas, address_space=None, size_encoding=None):
+    # A copy of the configuration with fresh variables, in another address space or with
+    # another size encoding where given
+    hw_configs = {}
+    copies = {}
+    for c in components:
+        hw = c.hw_config
+        if hw not in hw_configs:
+            hw_configs[hw] = HardwareConfig(hw.region_min_size, hw.region_count,
+                                            hw.subregion_count, hw.complex_overlap_constraint,
+                                            address_space or hw.address_space,
+                                            size_encoding or hw.size_encoding)
+        copies[c] = Component(c.name, hw_configs[hw])
+
+    partitions = {}
+    copied = []
+    for a in arenas:
+        readers = [copies[c] for c in a.readers]
+        writers = [copies[c] for c in a.writers]
+        if isinstance(a, PartitionArena):
+            p = a.partition
+            if p not in partitions:
+                partitions[p] = Partition(p.name, p.start, p.end,
+                                          address_space or p.address_space)
+            copied.append(PartitionArena(a.name, partitions[p], a.size, readers, writers))
+        else:
+            (start, end) = address_span(a)
+            copied.append(FixedArena(a.name, start, end, readers, writers,
+                                     address_space or a.address_space))
+    return ([copies[c] for c in components], copied)
+
+
+def narrowed_copy(components, arenas):
+    # A copy of the configuration in the narrowest address space that holds all of its
+    # partitions and fixed arenas, or the configuration itself if there is none. The space
+    # also holds every arena laid out from the start of its partition, so no arena size is
+    # truncated to its width even when the arena cannot fit its partition
+    spans = [address_span(a) for a in arenas]
+    if not spans or not all(isinstance(s, int) and isinstance(e, int) for (s, e) in spans):
+        return (components, arenas)
+    spans += [(a.partition.start, a.partition.start + a.size) for a in arenas
+              if isinstance(a, PartitionArena)]
+    region_min_size = min([c.hw_config.region_min_size for c in components] or [256])
+    return copy_config(components, arenas, narrow_address_space(spans, region_min_size))
+
+
+def model(components, arenas, quantifier_free=False, solver=None, overlap_encoding="pairwise",
+          symmetry_breaking=False, build=None):
+    # build is called with the name and the builder of each constraint family and returns its
+    # constraints, instrumentation uses it to measure them
+    if len(address_spaces(components, arenas)) > 1:
+        raise ValueError("Components and arenas use different address spaces")
+    s = z3.Solver() if solver is None else solver
+    for (family, build_family) in constraint_families(components, arenas, quantifier_free,
+                                                      overlap_encoding, symmetry_breaking):
+        s.add(*(build_family() if build is None else build(family, build_family)))
     return s
+
+
+def extract_layout(m, components, arenas):
+    def value(term):
+        if isinstance(term, int):
+            return term
+        return m.eval(term, model_completion=True).as_long()
+
+    def flag(term):
+        return z3.is_true(m.eval(term, model_completion=True))
+
+    layout = {"arenas": [], "components": []}
+    for a in arenas:
+        layout["arenas"].append({"name": a.name,
+                                 "start": a.address_space.absolute(value(a.start)),
+                                 "end": a.address_space.absolute(value(a.end))})
+    for c in components:
+        regions = []
+        for r in c.regions:
+            if value(r.size) == 0:
+                continue
+            regions.append({"start": c.hw_config.address_space.absolute(value(r.start)),
+                            "size": value(r.size),
+                            "readable": flag(r.readable),
+                            "writeable": flag(r.writeable),
+                            "subregions": [flag(sr.enabled) for sr in r.subregions]})
+        layout["components"].append({"name": c.name, "regions": regions})
+    return layout
@@ -0,0 +1,35 @@
+from z3 import sat, unsat
+
+from cache import ResultCache
+from solver import Component, HardwareConfig, Partition, PartitionArena
+
+
+def config(sram_size):
+    c = Component("c", HardwareConfig(region_min_size=256, region_count=2, subregion_count=8))
+    sram = Partition("sram", 0x20000000, 0x20000000 + sram_size)
+    return ([c], [PartitionArena("c/data", sram, 0x400, [c], [c])])
+
+
+def test_sat_answers_larger_sizes(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.store(*config(0x1000), sat)
+    assert cache.lookup(*config(0x1000)) == sat
+    assert cache.lookup(*config(0x2000)) == sat
+    assert cache.lookup(*config(0x800)) is None
+    cache.close()
+
+
+def test_unsat_answers_smaller_sizes(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.store(*config(0x400), unsat)
+    assert cache.lookup(*config(0x400)) == unsat
+    assert cache.lookup(*config(0x200)) == unsat
+    assert cache.lookup(*config(0x800)) is None
+    cache.close()
+
+
+def test_results_are_kept_apart_by_options(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.store(*config(0x1000), sat)
+    assert cache.lookup(*config(0x1000), quantifier_free=True) is None
+    cache.close()
@@ -0,0 +1,38 @@
+from z3 import sat, unsat
+
+from decompose import check_decomposed, split_region_budget
+from solver import Component, HardwareConfig, Partition, PartitionArena
+
+
+def config(region_count=4, sram_size=0x10000, data_size=0x100):
+    c = Component("c", HardwareConfig(region_min_size=256, region_count=region_count,
+                                      subregion_count=8))
+    flash = Partition("flash", 0x08000000, 0x08010000)
+    sram = Partition("sram", 0x20000000, 0x20000000 + sram_size)
+    arenas = [PartitionArena("c/code", flash, 0x100, [c], []),
+              PartitionArena("c/data", sram, data_size, [c], [c]),
+              PartitionArena("c/bss", sram, 0x100, [c], [c]),
+              PartitionArena("c/rodata", sram, 0x100, [c], [])]
+    return ([c], arenas, [flash, sram])
+
+
+def test_budget_gives_every_access_class_a_region():
+    # Flash needs one region and SRAM two, the spare one goes where more arenas share a class
+    (components, arenas, partitions) = config()
+    budget = split_region_budget(components, arenas, partitions)
+    assert budget == {("c", "flash"): range(0, 1), ("c", "sram"): range(1, 4)}
+
+
+def test_budget_without_enough_regions():
+    (components, arenas, partitions) = config(region_count=2)
+    assert split_region_budget(components, arenas, partitions) is None
+
+
+def test_decomposed_sat():
+    (components, arenas, _) = config()
+    assert check_decomposed(components, arenas, quantifier_free=True) == sat
+
+
+def test_decomposed_unsat_for_arena_larger_than_its_partition():
+    (components, arenas, _) = config(sram_size=0x400, data_size=69732)
+    assert check_decomposed(components, arenas, quantifier_free=True) == unsat
@@ -0,0 +1,35 @@
+from heuristic import greedy_layout, layout_size
+from solver import Component, FixedArena, HardwareConfig, Partition, PartitionArena
+from verify import check_layout
+
+
+def test_greedy_layout_with_fixed_arena():
+    hw_config = HardwareConfig(region_min_size=256, region_count=4, subregion_count=8)
+    c = Component("c", hw_config)
+    sram = Partition("sram", 0x20000000, 0x20010000)
+    arenas = [FixedArena("c/io", 0x20000180, 0x20000300, [c], [c]),
+              PartitionArena("c/data", sram, 0x400, [c], [c])]
+    layout = greedy_layout([c], arenas)
+    assert layout is not None
+    assert check_layout(layout, [c], arenas) == []
+    assert layout_size(layout, arenas) is not None
+
+
+def test_layout_size_without_sram_arena():
+    hw_config = HardwareConfig(region_min_size=256, region_count=4, subregion_count=8)
+    c = Component("c", hw_config)
+    arenas = [FixedArena("c/io", 0x40000000, 0x40000100, [c], [c])]
+    layout = greedy_layout([c], arenas)
+    assert check_layout(layout, [c], arenas) == []
+    assert layout_size(layout, arenas) is None
+
+
+def test_greedy_layout_moves_past_smaller_fixed_region():
+    hw_config = HardwareConfig(region_min_size=256, region_count=4, subregion_count=8)
+    c = Component("c", hw_config)
+    sram = Partition("sram", 0x20000000, 0x20010000)
+    arenas = [FixedArena("c/io", 0x20000000, 0x20000020, [c], [c]),
+              PartitionArena("c/data", sram, 0x300, [c], [c])]
+    layout = greedy_layout([c], arenas)
+    assert layout is not None
+    assert check_layout(layout, [c], arenas) == []
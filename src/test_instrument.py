@@ -0,0 +1,19 @@
+from z3 import sat
+
+from instrument import Instrumentation
+from solver import Component, HardwareConfig, Partition, PartitionArena
+
+
+def test_model_emits_a_build_event_per_family():
+    events = []
+    instrumentation = Instrumentation(events.append)
+    c = Component("c", HardwareConfig(region_min_size=256, region_count=2, subregion_count=8))
+    sram = Partition("sram", 0x20000000, 0x20010000)
+    arenas = [PartitionArena("c/data", sram, 0x100, [c], [c])]
+    s = instrumentation.model([c], arenas, {"size": 0x10000}, quantifier_free=True,
+                              symmetry_breaking=True)
+    assert instrumentation.check(s, size=0x10000) == sat
+    assert [e["family"] for e in events if e["event"] == "build"] == \
+        ["component_consistency", "arena_consistency", "arena_access", "arena_overlap",
+         "symmetry_breaking"]
+    assert all(e["size"] == 0x10000 for e in events)
@@ -0,0 +1,56 @@
+from heuristic import greedy_layout, layout_size
+from precheck import infeasibility_reasons, partition_lower_bound
+from solver import Component, FixedArena, HardwareConfig, Partition, PartitionArena
+from verify import check_layout
+
+
+def config(sram_size=0x10000, region_count=4):
+    hw_config = HardwareConfig(region_min_size=256, region_count=region_count,
+                               subregion_count=8)
+    (server, client) = (Component("server", hw_config), Component("client", hw_config))
+    sram = Partition("sram", 0x20000000, 0x20000000 + sram_size)
+    arenas = [PartitionArena("server/data", sram, 0x101, [server], [server]),
+              PartitionArena("client/data", sram, 0x101, [client], [client])]
+    return ([server, client], arenas)
+
+
+def test_lower_bound_counts_granules_per_access_set():
+    # Each arena needs nine 32 byte granules of its own, and the partition ends one byte later
+    (components, arenas) = config()
+    assert partition_lower_bound(components, arenas) == 17 * 32 + 2
+
+
+def test_lower_bound_is_below_a_working_size():
+    (components, arenas) = config()
+    layout = greedy_layout(components, arenas)
+    assert check_layout(layout, components, arenas) == []
+    assert partition_lower_bound(components, arenas) <= layout_size(layout, arenas)
+
+
+def test_lower_bound_without_partition_arenas():
+    (components, arenas) = config()
+    assert partition_lower_bound(components, arenas, "flash") is None
+
+
+def test_no_reasons_for_a_feasible_config():
+    assert infeasibility_reasons(*config()) == []
+
+
+def test_partition_too_small():
+    assert infeasibility_reasons(*config(sram_size=0x200)) == \
+        ["Partition sram has 512 bytes, its arenas need at least 546"]
+
+
+def test_overlapping_fixed_arenas():
+    (components, arenas) = config()
+    arenas += [FixedArena("io/a", 0x40000000, 0x40000100, components, components),
+               FixedArena("io/b", 0x40000080, 0x40000180, components, components)]
+    assert infeasibility_reasons(components, arenas) == ["Fixed arenas io/a and io/b overlap"]
+
+
+def test_more_access_classes_than_regions():
+    (components, arenas) = config(region_count=1)
+    (server, client) = components
+    arenas.append(PartitionArena("client/rodata", arenas[0].partition, 0x100, [server], []))
+    assert infeasibility_reasons(components, arenas) == \
+        ["Component server accesses arenas in 2 ways with 1 regions"]
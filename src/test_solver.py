@@ -0,0 +1,26 @@
+from z3 import sat, unsat
+
+from solver import model, narrowed_copy, Component, FixedArena, HardwareConfig, Partition, \
+    PartitionArena
+
+
+def small_hw_config():
+    return HardwareConfig(region_min_size=256, region_count=2, subregion_count=8)
+
+
+def test_fixed_arena_quantifier_free():
+    hw_config = small_hw_config()
+    c = Component("c", hw_config)
+    sram = Partition("sram", 0x20000000, 0x20010000)
+    arenas = [FixedArena("c/io", 0x40000000, 0x40000100, [c], [c]),
+              PartitionArena("c/data", sram, 0x100, [c], [c])]
+    assert model([c], arenas, quantifier_free=True).check() == sat
+
+
+def test_narrowed_copy_keeps_arenas_larger_than_their_partition():
+    hw_config = small_hw_config()
+    c = Component("c", hw_config)
+    sram = Partition("sram", 0x20000000, 0x20000400)
+    arenas = [PartitionArena("c/data", sram, 69732, [c], [c])]
+    (components, narrowed) = narrowed_copy([c], arenas)
+    assert model(components, narrowed, quantifier_free=True).check() == unsat
@@ -0,0 +1,31 @@
+from z3 import sat, unsat
+
+from solver import extract_layout, model, narrowed_copy, Component, HardwareConfig, Partition, \
+    PartitionArena
+from twostage import check_two_stage
+from verify import check_layout
+
+
+def config(sram_size):
+    hw_config = HardwareConfig(region_min_size=256, region_count=3, subregion_count=8)
+    (server, client) = (Component("server", hw_config), Component("client", hw_config))
+    sram = Partition("sram", 0x20000000, 0x20000000 + sram_size)
+    arenas = [PartitionArena("server/data", sram, 0x300, [server], [server]),
+              PartitionArena("client/data", sram, 0x300, [client], [client]),
+              PartitionArena("shared", sram, 0x100, [server, client], [server])]
+    return narrowed_copy([server, client], arenas)
+
+
+def test_two_stage_layout_is_valid():
+    (components, arenas) = config(0x1000)
+    (result, s) = check_two_stage(components, arenas, quantifier_free=True)
+    assert result == sat
+    layout = extract_layout(s.model(), components, arenas)
+    assert check_layout(layout, components, arenas) == []
+
+
+def test_two_stage_matches_joint_model_when_unsat():
+    (components, arenas) = config(0x700)
+    assert model(components, arenas, quantifier_free=True).check() == unsat
+    (components, arenas) = config(0x700)
+    assert check_two_stage(components, arenas, quantifier_free=True)[0] == unsat
@@ -0,0 +1,75 @@
+import copy
+
+from heuristic import greedy_layout
+from solver import Component, HardwareConfig, Partition, PartitionArena
+from verify import check_layout
+
+
+def config(complex_overlap_constraint=False):
+    hw_config = HardwareConfig(region_min_size=256, region_count=4, subregion_count=8,
+                               complex_overlap_constraint=complex_overlap_constraint)
+    (server, client) = (Component("server", hw_config), Component("client", hw_config))
+    sram = Partition("sram", 0x20000000, 0x20010000)
+    arenas = [PartitionArena("server/data", sram, 0x400, [server], [server]),
+              PartitionArena("client/data", sram, 0x400, [client], [client])]
+    return ([server, client], arenas)
+
+
+def broken(mutate, complex_overlap_constraint=False):
+    (components, arenas) = config(complex_overlap_constraint)
+    layout = greedy_layout(components, arenas)
+    assert check_layout(layout, components, arenas) == []
+    layout = copy.deepcopy(layout)
+    mutate(layout)
+    return check_layout(layout, components, arenas)
+
+
+def arena(layout, name):
+    return [a for a in layout["arenas"] if a["name"] == name][0]
+
+
+def region(layout, name):
+    return [c for c in layout["components"] if c["name"] == name][0]["regions"][0]
+
+
+def test_misaligned_region():
+    def mutate(layout):
+        region(layout, "server")["start"] += 0x100
+    assert "server: region 0 start is not aligned to size 1024" in broken(mutate)
+
+
+def test_size_not_power_of_two():
+    def mutate(layout):
+        region(layout, "server")["size"] = 0x600
+    assert "server: region 0 size 1536 is not a power of two" in broken(mutate)
+
+
+def test_overlapping_arenas():
+    def mutate(layout):
+        (server, client) = (arena(layout, "server/data"), arena(layout, "client/data"))
+        (client["start"], client["end"]) = (server["start"] + 0x100, server["end"] + 0x100)
+    assert "server/data and client/data overlap" in broken(mutate)
+
+
+def test_unauthorised_component_reaches_arena():
+    def mutate(layout):
+        region(layout, "client").update(region(layout, "server"))
+    violations = broken(mutate)
+    assert "server/data: client can read it" in violations
+    assert "server/data: client can write it" in violations
+
+
+def test_uncovered_arena():
+    def mutate(layout):
+        region(layout, "server")["subregions"][-1] = False
+    violations = broken(mutate)
+    assert "server/data: server cannot read all of it" in violations
+    assert "server/data: server cannot write all of it" in violations
+
+
+def test_overlapping_enabled_subregions():
+    def mutate(layout):
+        regions = [c for c in layout["components"] if c["name"] == "server"][0]["regions"]
+        regions.append(dict(regions[0], readable=True, writeable=False))
+    assert "server: enabled subregions of regions 0 and 1 overlap" in \
+        broken(mutate, complex_overlap_constraint=True)
@@ -0,0 +1,217 @@
+import datetime
+
+import z3
+from z3 import Bool, sat, unsat
+
+from solver import And, Implies, Not, Or, arenas_disjoint, arenas_ordered, model
+
+
+def accessors(c, arenas):
+    # The arenas a component has to reach, with the permissions it needs for each
+    return [(a, (c in a.readers, c in a.writers)) for a in arenas
+            if c in a.readers or c in a.writers]
+
+
+class Assignment(object):
+    # Stage one: which regions of each component reach into each arena it accesses, and with
+    # which permissions. A region grants no more than each of its arenas allows, and between
+    # them the regions of an arena grant all it needs. Regions of a component are
+    # interchangeable, they are used in the order of the first arena assigned to them. Every
+    # layout of the joint model maps to one of these once regions that grant nothing or touch
+    # no arena are emptied, so running out of them means the configuration is unsat
+    def __init__(self, components, arenas):
+        self.s = z3.Solver()
+        self.slots = {}
+        self.permissions = {}
+        self.unused = {}
+        for c in components:
+            accessed = accessors(c, arenas)
+            if not accessed:
+                continue
+            regions = range(c.hw_config.region_count)
+            for r in c.regions:
+                self.permissions[r] = (Bool("assign/{}/can_read".format(r.name)),
+                                       Bool("assign/{}/can_write".format(r.name)))
+            for (k, (a, (reads, writes))) in enumerate(accessed):
+                for i in regions:
+                    x = Bool("assign/{}/{}".format(a.name, c.regions[i].name))
+                    self.slots[(a, c, i)] = x
+                    (can_read, can_write) = self.permissions[c.regions[i]]
+                    self.s.add(Implies(x, And(Implies(can_read, reads),
+                                              Implies(can_write, writes),
+                                              Or(can_read, can_write))))
+                    if i > 0:
+                        earlier = [self.slots[(b, c, i - 1)] for (b, _) in accessed[:k + 1]]
+                        self.s.add(Implies(x, Or(earlier)))
+                for (needed, p) in [(reads, 0), (writes, 1)]:
+                    if needed:
+                        self.s.add(Or([And(self.slots[(a, c, i)],
+                                           self.permissions[c.regions[i]][p])
+                                       for i in regions]))
+            for (i, r) in enumerate(c.regions):
+                unused = Bool("assign/{}/unused".format(r.name))
+                self.unused[r] = unused
+                self.s.add(unused == Not(Or([self.slots[(a, c, i)] for (a, _) in accessed])))
+                self.s.add(Implies(unused, Not(Or(self.permissions[r]))))
+
+    def next(self):
+        # The literals of the next assignment worth placing, None once there is none left
+        if not self.s.check() == sat:
+            return None
+        m = self.s.model()
+
+        def literal(x):
+            return x if z3.is_true(m.eval(x, model_completion=True)) else Not(x)
+
+        literals = [literal(x) for x in self.slots.values()]
+        for (r, unused) in self.unused.items():
+            if z3.is_true(m.eval(unused, model_completion=True)):
+                literals.append(unused)
+            else:
+                literals += [literal(p) for p in self.permissions[r]]
+        return literals
+
+    def block(self, literals):
+        self.s.add(Not(And(literals)))
+
+
+def covered(a, subregions):
+    # The arena lies within the union of the subregions, of which only the enabled ones count
+    return a.covered_by([(True, sr) for sr in subregions],
+                        lambda addr: Or([sr.is_enabled(addr) for sr in subregions]))
+
+
+def clear(a, regions):
+    return a.disjoint_from([(True, sr) for r in regions for sr in r.subregions])
+
+
+class Placement(object):
+    # Stage two: only the geometry of an assignment. Regions and arenas are consistent and
+    # arenas are disjoint whatever the assignment. An assignment adds which regions cover its
+    # arenas and which stay clear of them, with none of the choices of the joint model left.
+    # A sat here is a sat of the configuration
+    def __init__(self, components, arenas, assignment, quantifier_free=False,
+                 overlap_encoding="pairwise", symmetry_breaking=False):
+        self.components = components
+        self.arenas = arenas
+        self.assignment = assignment
+        self.base = []
+        for c in components:
+            self.base += c.is_consistent(quantifier_free)
+        for a in arenas:
+            self.base += a.is_consistent()
+        self.base.append(arenas_disjoint(arenas, overlap_encoding))
+        # Stage one already orders the regions of a component by their first arena
+        if symmetry_breaking:
+            self.base.append(arenas_ordered(arenas))
+
+        # Every region of a layout of an assignment grants something, so regions of components
+        # that do not access an arena stay clear of it
+        for c in components:
+            accessed = [a for (a, _) in accessors(c, arenas)]
+            if not accessed:
+                for r in c.regions:
+                    self.base += [r.size == 0, Not(r.readable), Not(r.writeable)]
+            for a in arenas:
+                if a not in accessed:
+                    self.base.append(clear(a, c.regions))
+
+    def solver(self):
+        s = z3.Solver()
+        s.add(*self.base)
+        return s
+
+    def constraints(self, literals):
+        # The constraints of an assignment, each with the literals it follows from
+        literal = dict((x.arg(0).get_id() if z3.is_not(x) else x.get_id(), x) for x in literals)
+
+        def value(x):
+            return x.get_id() in literal and not z3.is_not(literal[x.get_id()])
+
+        assignment = self.assignment
+        constraints = []
+        for (r, unused) in assignment.unused.items():
+            (can_read, can_write) = assignment.permissions[r]
+            if value(unused):
+                constraints.append((And(r.size == 0, Not(r.readable), Not(r.writeable)),
+                                    [unused]))
+            else:
+                constraints.append((And(r.readable == value(can_read),
+                                        r.writeable == value(can_write)),
+                                    [literal[can_read.get_id()], literal[can_write.get_id()]]))
+        for c in self.components:
+            for (a, needs) in accessors(c, self.arenas):
+                slots = [assignment.slots[(a, c, i)] for i in range(len(c.regions))]
+                for (r, x) in zip(c.regions, slots):
+                    if not value(x):
+                        constraints.append((clear(a, [r]), [literal[x.get_id()]]))
+                assigned = [r for (r, x) in zip(c.regions, slots) if value(x)]
+                for (needed, p) in zip(needs, [0, 1]):
+                    if needed:
+                        regions = [r for r in assigned if value(assignment.permissions[r][p])]
+                        because = [literal[x.get_id()] for x in slots] + \
+                            [literal[assignment.permissions[r][p].get_id()] for r in assigned]
+                        constraints.append(
+                            (covered(a, [sr for r in regions for sr in r.subregions]), because))
+        return constraints
+
+    def check(self, literals, solve):
+        # The result for the assignment, the solver holding it and, if unsat, the literals of
+        # it an unsat core names. Tracking constraints keeps z3 from preprocessing them, so the
+        # assignment is solved without and only an unsat one is checked again for its core
+        constraints = self.constraints(literals)
+        s = self.solver()
+        s.add(*[constraint for (constraint, _) in constraints])
+        result = solve(s)
+        if result != unsat:
+            return (result, s, None)
+
+        tracked = self.solver()
+        for (i, (constraint, _)) in enumerate(constraints):
+            tracked.assert_and_track(constraint, Bool("placement/{}".format(i)))
+        if tracked.check() != unsat:
+            return (result, s, literals)
+        named = set(t.get_id() for t in tracked.unsat_core())
+        core = []
+        for (i, (_, because)) in enumerate(constraints):
+            if Bool("placement/{}".format(i)).get_id() in named:
+                core += [x for x in because if not any(x.eq(y) for y in core)]
+        return (result, s, core)
+
+
+def check_two_stage(components, arenas, solve=None, max_rounds=32, **model_options):
+    # Assignments the placement rejects are blocked in stage one by the part of them its
+    # unsat core names. Running out of assignments that way proves unsat. An assignment the
+    # placement gives up on is blocked whole without that proof, so then, as when the rounds
+    # run out, the probe falls back to the joint model. Returns the result and the solver a
+    # sat model can be taken from
+    if solve is None:
+        def solve(s):
+            return s.check()
+
+    assignment = Assignment(components, arenas)
+    placement = Placement(components, arenas, assignment, **model_options)
+    proven = True
+    s = None
+    for attempt in range(max_rounds):
+        literals = assignment.next()
+        if literals is None:
+            if proven:
+                return (unsat, s or placement.solver())
+            break
+        (result, s, core) = placement.check(literals, solve)
+        print('({:%Y-%m-%d %H:%M:%S}) Assignment {}: {}'.format(datetime.datetime.now(),
+                                                                attempt, result))
+        if result == sat:
+            return (sat, s)
+        if result != unsat:
+            proven = False
+            assignment.block(literals)
+            continue
+        if not core:
+            # The placement fails whatever the assignment
+            return (unsat, s)
+        assignment.block(core)
+
+    s = model(components, arenas, **model_options)
+    return (solve(s), s)
@@ -0,0 +1,227 @@
+#!/usr/local/bin/python3
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from solver import FixedArena
+
+ADDRESS_LIMIT = 2 ** 32
+
+
+def union(starts, ends, groups):
+    # The disjoint intervals covering the same addresses as the given ones, sorted by start.
+    # Every group is moved to its own stretch of the number line, so groups never merge
+    if len(starts) == 0:
+        return (np.zeros(0, np.int64), np.zeros(0, np.int64))
+    starts = starts + (groups << 33)
+    ends = ends + (groups << 33)
+    order = np.argsort(starts, kind="stable")
+    (starts, ends) = (starts[order], ends[order])
+    reach = np.maximum.accumulate(ends)
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = starts[1:] > reach[:-1]
+    last = np.append(np.nonzero(first)[0][1:] - 1, len(starts) - 1)
+    return (starts[first], reach[last])
+
+
+def covered(union_starts, union_ends, starts, ends, groups):
+    # Whether each interval lies within one interval of the union of its group
+    starts = starts + (groups << 33)
+    ends = ends + (groups << 33)
+    if len(union_starts) == 0:
+        return np.zeros(len(starts), dtype=bool)
+    i = np.searchsorted(union_starts, starts, side="right") - 1
+    return (i >= 0) & (union_ends[np.maximum(i, 0)] >= ends)
+
+
+def pairs(mask):
+    return zip(*np.nonzero(np.triu(mask, k=1)))
+
+
+def region_table(layout, components):
+    # One row per nonempty region of the layout, regions without a subregion mask have all
+    # of their subregions enabled
+    component_layouts = dict((c["name"], c) for c in layout["components"])
+    violations = []
+    rows = []
+    masks = []
+    for (i, c) in enumerate(components):
+        hw = c.hw_config
+        if c.name not in component_layouts:
+            violations.append("{}: missing from the layout".format(c.name))
+            continue
+        regions = component_layouts[c.name]["regions"]
+        if len(regions) > hw.region_count:
+            violations.append("{}: {} regions, only {} available".format(
+                c.name, len(regions), hw.region_count))
+        for (j, r) in enumerate(regions):
+            mask = r.get("subregions", [True] * hw.subregion_count)
+            if len(mask) != hw.subregion_count:
+                violations.append("{}: region {} has {} subregions instead of {}".format(
+                    c.name, j, len(mask), hw.subregion_count))
+                continue
+            if r["size"] == 0:
+                continue
+            rows.append((i, j, r["start"], r["size"], hw.subregion_count, hw.region_min_size,
+                         r["readable"], r["writeable"]))
+            masks += mask
+    table = np.array(rows, dtype=np.int64).reshape(-1, 8)
+    return (table, np.array(masks, dtype=bool), violations)
+
+
+def check_regions(table, components):
+    violations = []
+    (comp, number, start, size, count, min_size) = table[:, :6].T
+    checks = [
+        ("size {} is not a power of two", (size & (size - 1)) != 0),
+        ("size {} does not split into subregions", size % count != 0),
+        ("size {} is below the minimum", size < min_size),
+        ("start is not aligned to size {}", start % size != 0),
+        ("size {} runs past the end of the address space", start + size > ADDRESS_LIMIT),
+    ]
+    for (message, failed) in checks:
+        for k in np.nonzero(failed)[0]:
+            violations.append("{}: region {} {}".format(components[comp[k]].name, number[k],
+                                                        message.format(size[k])))
+
+    # Without the complex overlap constraint whole regions of a component cannot overlap
+    simple = np.array([not c.hw_config.complex_overlap_constraint for c in components],
+                      dtype=bool)[comp]
+    end = start + size
+    clash = (comp[:, None] == comp[None, :]) & simple[:, None] & \
+        (start[:, None] < end[None, :]) & (start[None, :] < end[:, None])
+    for (k, l) in pairs(clash):
+        violations.append("{}: regions {} and {} overlap".format(
+            components[comp[k]].name, number[k], number[l]))
+    return violations
+
+
+def subregion_table(table, masks):
+    # Subregions of every region as (region row, start, end, enabled)
+    count = table[:, 4]
+    row = np.repeat(np.arange(len(table)), count)
+    k = np.arange(len(row)) - np.repeat(np.cumsum(count) - count, count)
+    subregion_size = (table[:, 3] // count)[row]
+    start = table[row, 2] + k * subregion_size
+    return (row, start, start + subregion_size, masks & (subregion_size > 0))
+
+
+def check_subregions(table, row, start, end, enabled, components):
+    # With the complex overlap constraint only the enabled subregions of different regions of
+    # a component cannot overlap
+    comp = table[row, 0]
+    complex_overlap = np.array([c.hw_config.complex_overlap_constraint for c in components],
+                               dtype=bool)[comp]
+    active = enabled & complex_overlap
+    clash = (comp[:, None] == comp[None, :]) & (row[:, None] != row[None, :]) & \
+        active[:, None] & active[None, :] & \
+        (start[:, None] < end[None, :]) & (start[None, :] < end[:, None])
+    violations = []
+    for (k, l) in pairs(clash):
+        violations.append("{}: enabled subregions of regions {} and {} overlap".format(
+            components[comp[k]].name, table[row[k], 1], table[row[l], 1]))
+    return violations
+
+
+def arena_table(layout, arenas):
+    # Arenas missing from the layout are left empty, which takes them out of the later checks
+    arena_layouts = dict((a["name"], a) for a in layout["arenas"])
+    violations = []
+    bounds = []
+    for a in arenas:
+        if a.name not in arena_layouts:
+            violations.append("{}: missing from the layout".format(a.name))
+            bounds.append((0, 0))
+            continue
+        (start, end) = (arena_layouts[a.name]["start"], arena_layouts[a.name]["end"])
+        bounds.append((start, end))
+        if end - start != a.size:
+            violations.append("{}: spans {} bytes instead of {}".format(a.name, end - start,
+                                                                        a.size))
+        if isinstance(a, FixedArena):
+            if start != a.address_space.absolute(a.start):
+                violations.append("{}: moved from its fixed position".format(a.name))
+        elif not a.partition.start <= start or not end < a.partition.end:
+            violations.append("{}: outside of partition {}".format(a.name, a.partition.name))
+    return (np.array(bounds, dtype=np.int64).reshape(-1, 2), violations)
+
+
+def check_arenas(bounds, arenas):
+    (start, end) = bounds.T
+    violations = []
+    for k in np.nonzero(start > end)[0]:
+        violations.append("{}: ends before it starts".format(arenas[k].name))
+    clash = (start[:, None] < end[None, :]) & (start[None, :] < end[:, None])
+    for (k, l) in pairs(clash):
+        violations.append("{} and {} overlap".format(arenas[k].name, arenas[l].name))
+    return violations
+
+
+def check_access(bounds, arenas, components, table, row, start, end, enabled):
+    # Every reader has to cover its arenas with readable subregions and every other component
+    # must not reach into them, and the same for writers
+    index = dict((c, i) for (i, c) in enumerate(components))
+    comp = table[row, 0]
+    (a_start, a_end) = bounds.T
+    nonempty = a_start < a_end
+    hits = (start[None, :] < a_end[:, None]) & (a_start[:, None] < end[None, :]) & \
+        nonempty[:, None]
+    owners = np.zeros((len(comp), len(components)), dtype=np.int64)
+    owners[np.arange(len(comp)), comp] = 1
+
+    violations = []
+    for (kind, column) in [("read", 6), ("write", 7)]:
+        accessible = enabled & (table[row, column] != 0)
+        allowed = np.zeros((len(arenas), len(components)), dtype=bool)
+        for (k, a) in enumerate(arenas):
+            for c in (a.readers if kind == "read" else a.writers):
+                allowed[k, index[c]] = True
+
+        reaches = ((hits & accessible[None, :]).astype(np.int64) @ owners) > 0
+        for (k, i) in zip(*np.nonzero(reaches & ~allowed)):
+            violations.append("{}: {} can {} it".format(arenas[k].name, components[i].name,
+                                                        kind))
+
+        (union_starts, union_ends) = union(start[accessible], end[accessible],
+                                           comp[accessible])
+        (k, i) = np.nonzero(allowed & nonempty[:, None])
+        ok = covered(union_starts, union_ends, a_start[k], a_end[k], i)
+        for (k, i) in zip(k[~ok], i[~ok]):
+            violations.append("{}: {} cannot {} all of it".format(arenas[k].name,
+                                                                  components[i].name, kind))
+    return violations
+
+
+def check_layout(layout, components, arenas):
+    # Checks a concrete layout against every constraint of the model without a solver, and
+    # returns what is wrong with it. Addresses in the layout are absolute
+    (table, masks, violations) = region_table(layout, components)
+    violations += check_regions(table, components)
+    (row, start, end, enabled) = subregion_table(table, masks)
+    violations += check_subregions(table, row, start, end, enabled, components)
+    (bounds, arena_violations) = arena_table(layout, arenas)
+    violations += arena_violations
+    violations += check_arenas(bounds, arenas)
+    violations += check_access(bounds, arenas, components, table, row, start, end, enabled)
+    return violations
+
+
+if __name__ == '__main__':
+    from batch import build_config
+
+    parser = argparse.ArgumentParser(description="Check a layout against its input spec")
+    parser.add_argument("spec", help="JSON input spec")
+    parser.add_argument("layout", help="JSON layout")
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        (components, arenas) = build_config(json.load(f))
+    with open(args.layout) as f:
+        violations = check_layout(json.load(f), components, arenas)
+    for violation in violations:
+        print(violation)
+    if violations:
+        sys.exit(1)
+    print("Layout is valid")
@@ -1,4 +1,4 @@
-from solver import Component, HardwareConfig, Partition, PartitionArena
+from solver import copy_config, narrowed_copy, Component, HardwareConfig, Partition, PartitionArena
 
 
 # Helper functions
@@ -53,136 +53,42 @@ def get_hardware_configuration(ram_size, complex_overlap_constraint):
 
 
 # These functions create setups of VMs, returning (hw_config, flash, sram, components, arenas) pairs
-def setup_config_1(ram_size, complex_overlap_constraint):  # IDEA: Just three small VM
+def setup_with_vms(vms, ram_size, complex_overlap_constraint):
     (hw_config, flash, sram) = get_hardware_configuration(ram_size, complex_overlap_constraint)
     components = []
     all_arenas = []
 
-    (comp, arenas) = vm_basicmath(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_dijkstra(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_gsm(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
+    for vm in vms:
+        (comp, arenas) = vm(hw_config, flash, sram)
+        components.append(comp)
+        all_arenas += arenas
 
     return (hw_config, flash, sram, components, all_arenas)
 
 
-def setup_config_2(ram_size, complex_overlap_constraint):  # IDEA: Three small VMs + one big VM
-    (hw_config, flash, sram) = get_hardware_configuration(ram_size, complex_overlap_constraint)
-    components = []
-    all_arenas = []
-
-    (comp, arenas) = vm_basicmath(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_dijkstra(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_gsm(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
+def setup_config_1(ram_size, complex_overlap_constraint):  # IDEA: Just three small VM
+    return setup_with_vms([vm_basicmath, vm_dijkstra, vm_gsm], ram_size,
+                          complex_overlap_constraint)
 
-    (comp, arenas) = vm_big(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
 
-    return (hw_config, flash, sram, components, all_arenas)
+def setup_config_2(ram_size, complex_overlap_constraint):  # IDEA: Three small VMs + one big VM
+    return setup_with_vms([vm_basicmath, vm_dijkstra, vm_gsm, vm_big], ram_size,
+                          complex_overlap_constraint)
 
 
 def setup_config_3(ram_size, complex_overlap_constraint):  # IDEA: Four small VMs + one big VM
-    (hw_config, flash, sram) = get_hardware_configuration(ram_size, complex_overlap_constraint)
-    components = []
-    all_arenas = []
-
-    (comp, arenas) = vm_basicmath(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_dijkstra(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_gsm(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_pbmsrch(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_big(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    return (hw_config, flash, sram, components, all_arenas)
+    return setup_with_vms([vm_basicmath, vm_dijkstra, vm_gsm, vm_pbmsrch, vm_big], ram_size,
+                          complex_overlap_constraint)
 
 
 def setup_config_4(ram_size, complex_overlap_constraint):  # IDEA: Five small VMs
-    (hw_config, flash, sram) = get_hardware_configuration(ram_size, complex_overlap_constraint)
-    components = []
-    all_arenas = []
-
-    (comp, arenas) = vm_basicmath(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_dijkstra(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_gsm(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_pbmsrch(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_rijndael(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    return (hw_config, flash, sram, components, all_arenas)
+    return setup_with_vms([vm_basicmath, vm_dijkstra, vm_gsm, vm_pbmsrch, vm_rijndael],
+                          ram_size, complex_overlap_constraint)
 
 
 def setup_config_5(ram_size, complex_overlap_constraint):  # IDEA: Five small VMs + one big VM
-    (hw_config, flash, sram) = get_hardware_configuration(ram_size, complex_overlap_constraint)
-    components = []
-    all_arenas = []
-
-    (comp, arenas) = vm_basicmath(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_dijkstra(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_gsm(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_pbmsrch(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_rijndael(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    (comp, arenas) = vm_big(hw_config, flash, sram)
-    components.append(comp)
-    all_arenas += arenas
-
-    return (hw_config, flash, sram, components, all_arenas)
+    return setup_with_vms([vm_basicmath, vm_dijkstra, vm_gsm, vm_pbmsrch, vm_rijndael, vm_big],
+                          ram_size, complex_overlap_constraint)
 
 
 # These functions turn a setup into an actual testable configuration
@@ -198,13 +104,13 @@ KERNEL_CODE = 134727
 KERNEL_DATA = 158 + 36816
 
 
-def add_io_manager(config_result):
+def add_io_manager(config_result, shared_size=SHARED_SIZE):
     (hw_config, flash, sram, components, arenas) = config_result
     io_manager = Component("io_manager", hw_config)
     io_man_code = PartitionArena("io_manager/code", flash, IO_MAN_CODE, [io_manager], [])
     io_man_main = PartitionArena("io_manager/main", sram, IO_MAN_DATA, [io_manager], [io_manager])
     for c in components:
-        shared = PartitionArena(c.name + "+io_manager/shared", sram, SHARED_SIZE,
+        shared = PartitionArena(c.name + "+io_manager/shared", sram, shared_size,
                                 [io_manager, c], [io_manager, c])
         arenas.append(shared)
     components.append(io_manager)
@@ -231,7 +137,7 @@ def add_kernel_regions(config_result):
     return (hw_config, flash, sram, components, arenas)
 
 
-def add_chaining(config_result):
+def add_chaining(config_result, shared_size=SHARED_SIZE):
     (hw_config, flash, sram, components, arenas) = config_result
     start = None
     prev = None
@@ -239,28 +145,46 @@ def add_chaining(config_result):
         if prev is None:
             start = c
         else:
-            shared_region = PartitionArena(c.name + "+" + prev.name + "/shared", sram, SHARED_SIZE,
+            shared_region = PartitionArena(c.name + "+" + prev.name + "/shared", sram, shared_size,
                                            [prev, c], [prev, c])
             arenas.append(shared_region)
         prev = c
-    final_region = PartitionArena(c.name + "+" + prev.name + "/shared", sram, SHARED_SIZE,
+    final_region = PartitionArena(c.name + "+" + prev.name + "/shared", sram, shared_size,
                                   [start, prev], [start, prev])
     arenas.append(final_region)
     return (hw_config, flash, sram, components, arenas)
 
 
-def add_all_shared(config_result):
+def add_all_shared(config_result, shared_size=SHARED_SIZE):
     (hw_config, flash, sram, components, arenas) = config_result
     for c1 in components:
         for c2 in components:
             if c1 == c2:
                 continue
             shared_region = PartitionArena(c1.name + "+" + c2.name + "/shared", sram,
-                                           SHARED_SIZE, [c1], [c2])
+                                           shared_size, [c1], [c2])
             arenas.append(shared_region)
     return (hw_config, flash, sram, components, arenas)
 
 
+class ConfigGenerator(object):
+    # A picklable pairing of a setup and a finalizer, so worker processes can rebuild configs
+    def __init__(self, setup, finalizer, narrow=False, size_encoding=None):
+        self.setup = setup
+        self.finalizer = finalizer
+        self.narrow = narrow
+        self.size_encoding = size_encoding
+
+    def __call__(self, ram_size, complex_overlap_constraint):
+        (components, arenas) = self.finalizer(self.setup(ram_size, complex_overlap_constraint))
+        if self.size_encoding is not None:
+            (components, arenas) = copy_config(components, arenas,
+                                               size_encoding=self.size_encoding)
+        if self.narrow:
+            return narrowed_copy(components, arenas)
+        return (components, arenas)
+
+
 def configure_setup_with_io_manager(config_result):
     config_result = add_io_manager(config_result)
     config_result = add_scheduler(config_result)
@@ -0,0 +1,152 @@
+#!/usr/local/bin/python3
+import argparse
+import json
+import math
+import random
+
+import z3
+
+from solver import HardwareConfig, Partition, PartitionArena
+from vms import add_all_shared, add_chaining, add_io_manager, add_kernel_regions, add_scheduler, \
+    gen_component, mb, ConfigGenerator, KERNEL_CODE, SHARED_SIZE
+
+TOPOLOGIES = ["none", "chain", "all_pairs", "random"]
+
+# Sizes default to the range of the shipped VMs
+DEFAULT_WORKLOAD = {
+    "components": 6,
+    "seed": 0,
+    "code_size": {"distribution": "uniform", "min": 61961, "max": 193512},
+    "data_size": {"distribution": "uniform", "min": 30004, "max": 72192},
+    "topology": "none",
+    "density": 0.3,
+    "shared_size": SHARED_SIZE,
+    "io_manager": True,
+    "scheduler": True,
+    "kernel": True,
+    "region_count": 8,
+    "subregion_count": 8,
+    "min_region_size": 256,
+    "flash_size": None,
+}
+
+
+def sample_size(rng, spec):
+    if isinstance(spec, int):
+        return spec
+    distribution = spec.get("distribution", "uniform")
+    if distribution == "fixed":
+        return spec["value"]
+    elif distribution == "uniform":
+        return rng.randint(spec["min"], spec["max"])
+    elif distribution == "log_uniform":
+        return int(math.exp(rng.uniform(math.log(spec["min"]), math.log(spec["max"]))))
+    elif distribution == "choice":
+        return rng.choice(spec["values"])
+    raise ValueError("Unknown size distribution {}".format(distribution))
+
+
+def add_random_sharing(config_result, rng, density, shared_size=SHARED_SIZE):
+    # Every pair of components shares an arena with the given probability
+    (hw_config, flash, sram, components, arenas) = config_result
+    for (i, c1) in enumerate(components):
+        for c2 in components[i + 1:]:
+            if rng.random() < density:
+                arenas.append(PartitionArena(c1.name + "+" + c2.name + "/shared", sram,
+                                             shared_size, [c1, c2], [c1, c2]))
+    return (hw_config, flash, sram, components, arenas)
+
+
+class Workload(object):
+    # A synthetic setup described by a dict of the keys of DEFAULT_WORKLOAD. Sizes and
+    # topology are drawn from generators seeded by the description, so every call builds the
+    # same configuration
+    def __init__(self, description):
+        self.description = dict(DEFAULT_WORKLOAD, **description)
+        if self.description["topology"] not in TOPOLOGIES:
+            raise ValueError("Unknown topology {}".format(self.description["topology"]))
+        if self.description["components"] < 1:
+            raise ValueError("A workload needs at least one component")
+
+    def __repr__(self):
+        return "Workload({})".format(self.description)
+
+    def sizes(self):
+        d = self.description
+        rng = random.Random("{}/sizes".format(d["seed"]))
+        return [(sample_size(rng, d["code_size"]), sample_size(rng, d["data_size"]))
+                for _ in range(d["components"])]
+
+    def flash_size(self, sizes):
+        # Twice the code rounded up to whole megabytes, unless given
+        if self.description["flash_size"] is not None:
+            return self.description["flash_size"]
+        code = sum(text for (text, _) in sizes) + KERNEL_CODE
+        return mb(max(1, -(-2 * code // mb(1))))
+
+    def setup(self, ram_size, complex_overlap_constraint):
+        d = self.description
+        hw_config = HardwareConfig(region_min_size=d["min_region_size"],
+                                   region_count=d["region_count"],
+                                   subregion_count=d["subregion_count"],
+                                   complex_overlap_constraint=complex_overlap_constraint)
+        sizes = self.sizes()
+        flash = Partition("flash", 0x08000000, 0x08000000 + self.flash_size(sizes))
+        sram = Partition("sram", 0x20000000, 0x20000000 + ram_size)
+        components = []
+        all_arenas = []
+        for (i, (text, data)) in enumerate(sizes):
+            (comp, arenas) = gen_component("vm_{}".format(i), hw_config, flash, sram, text, data)
+            components.append(comp)
+            all_arenas += arenas
+        return (hw_config, flash, sram, components, all_arenas)
+
+    def finalize(self, config_result):
+        d = self.description
+        if d["topology"] == "chain" and d["components"] > 1:
+            config_result = add_chaining(config_result, d["shared_size"])
+        elif d["topology"] == "all_pairs":
+            config_result = add_all_shared(config_result, d["shared_size"])
+        elif d["topology"] == "random":
+            rng = random.Random("{}/topology".format(d["seed"]))
+            config_result = add_random_sharing(config_result, rng, d["density"],
+                                               d["shared_size"])
+        if d["io_manager"]:
+            config_result = add_io_manager(config_result, d["shared_size"])
+        if d["scheduler"]:
+            config_result = add_scheduler(config_result)
+        if d["kernel"]:
+            config_result = add_kernel_regions(config_result)
+        (hw_config, flash, sram, components, arenas) = config_result
+        return (components, arenas)
+
+
+def workload_generator(description, narrow=False, size_encoding=None):
+    # Plugs into everything that takes a ConfigGenerator, check_fragmentation included
+    workload = Workload(description)
+    return ConfigGenerator(workload.setup, workload.finalize, narrow, size_encoding)
+
+
+if __name__ == '__main__':
+    from shrinker import check_fragmentation
+
+    z3.set_option(max_args=10000000, max_lines=1000000, max_depth=10000000, max_visited=1000000)
+
+    parser = argparse.ArgumentParser(description="Fragmentation study of a synthetic workload")
+    parser.add_argument("description", nargs="?", default=None,
+                        help="JSON workload description, the default workload without one")
+    parser.add_argument("--components", type=int, default=None)
+    parser.add_argument("--topology", default=None, choices=TOPOLOGIES)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--quantifier-free", action="store_true")
+    args = parser.parse_args()
+
+    description = {}
+    if args.description is not None:
+        with open(args.description) as f:
+            description = json.load(f)
+    for key in ["components", "topology", "seed"]:
+        if getattr(args, key) is not None:
+            description[key] = getattr(args, key)
+    model_options = {"quantifier_free": True} if args.quantifier_free else {}
+    check_fragmentation(workload_generator(description), **model_options)